@@ -0,0 +1,42 @@
+"""Add corpus_tokens vocabulary index
+
+Revision ID: 5c1e9a7d2b40
+Revises: 82a21336fbb3
+Create Date: 2026-10-18 10:12:31.402817
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1e9a7d2b40'
+down_revision: Union[str, None] = '82a21336fbb3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('corpus_tokens',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('corpus_id', sa.Integer(), nullable=False),
+    sa.Column('token', sa.String(), nullable=False),
+    sa.Column('frequency', sa.Integer(), nullable=False),
+    sa.Column('length', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['corpus_id'], ['corpuses.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_corpus_tokens_id'), 'corpus_tokens', ['id'], unique=False)
+    op.create_index(op.f('ix_corpus_tokens_corpus_id'), 'corpus_tokens', ['corpus_id'], unique=False)
+    op.create_index('ix_corpus_tokens_corpus_id_length', 'corpus_tokens', ['corpus_id', 'length'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_corpus_tokens_corpus_id_length', table_name='corpus_tokens')
+    op.drop_index(op.f('ix_corpus_tokens_corpus_id'), table_name='corpus_tokens')
+    op.drop_index(op.f('ix_corpus_tokens_id'), table_name='corpus_tokens')
+    op.drop_table('corpus_tokens')
@@ -0,0 +1,45 @@
+"""Add content_hash to corpuses
+
+Revision ID: 9b3f4e2a6c18
+Revises: 5c1e9a7d2b40
+Create Date: 2026-10-18 13:40:05.118264
+
+"""
+import hashlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b3f4e2a6c18'
+down_revision: Union[str, None] = '5c1e9a7d2b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('corpuses') as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_corpuses_content_hash'), ['content_hash'], unique=False)
+
+    # Заполняем хеш для уже загруженных корпусов.
+    # Сначала только id, тексты читаются по одному, чтобы не держать в памяти все корпуса сразу
+    connection = op.get_bind()
+    corpuses = sa.table('corpuses', sa.column('id', sa.Integer), sa.column('text', sa.Text), sa.column('content_hash', sa.String))
+    corpus_ids = connection.execute(sa.select(corpuses.c.id)).scalars().all()
+    for corpus_id in corpus_ids:
+        text = connection.execute(sa.select(corpuses.c.text).where(corpuses.c.id == corpus_id)).scalar()
+        content_hash = hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+        connection.execute(
+            corpuses.update().where(corpuses.c.id == corpus_id).values(content_hash=content_hash)
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('corpuses') as batch_op:
+        batch_op.drop_index(batch_op.f('ix_corpuses_content_hash'))
+        batch_op.drop_column('content_hash')
@@ -0,0 +1,60 @@
+"""Move corpus text to compressed blob store
+
+Revision ID: c7d41e8b2f95
+Revises: 9b3f4e2a6c18
+Create Date: 2026-10-18 18:05:47.530921
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.config import settings
+from app.services.blob_store import compress_corpus_blob, read_corpus_blob, write_corpus_blob
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d41e8b2f95'
+down_revision: Union[str, None] = '9b3f4e2a6c18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Тексты корпусов переносятся из таблицы в сжатое хранилище CORPUS_DIR (файл по хешу содержимого).
+    # Тексты читаются по одному, чтобы не держать в памяти все корпуса сразу
+    connection = op.get_bind()
+    corpuses = sa.table('corpuses', sa.column('id', sa.Integer), sa.column('text', sa.Text), sa.column('content_hash', sa.String))
+    rows = connection.execute(sa.select(corpuses.c.id, corpuses.c.content_hash)).fetchall()
+    for corpus_id, content_hash in rows:
+        text = connection.execute(sa.select(corpuses.c.text).where(corpuses.c.id == corpus_id)).scalar()
+        if text is None and content_hash is not None:
+            # Корпус загружен потоком: файл уже есть, но записан без сжатия
+            compress_corpus_blob(settings.CORPUS_DIR, content_hash, settings.CORPUS_COMPRESSION)
+            continue
+        stored_hash = write_corpus_blob(settings.CORPUS_DIR, text or "", settings.CORPUS_COMPRESSION)
+        if stored_hash != content_hash:
+            connection.execute(
+                corpuses.update().where(corpuses.c.id == corpus_id).values(content_hash=stored_hash)
+            )
+
+    with op.batch_alter_table('corpuses') as batch_op:
+        batch_op.drop_column('text')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('corpuses') as batch_op:
+        batch_op.add_column(sa.Column('text', sa.String(), nullable=True))
+
+    # Тексты возвращаются в таблицу; файлы в CORPUS_DIR остаются на месте
+    connection = op.get_bind()
+    corpuses = sa.table('corpuses', sa.column('id', sa.Integer), sa.column('text', sa.Text), sa.column('content_hash', sa.String))
+    for corpus_id, content_hash in connection.execute(sa.select(corpuses.c.id, corpuses.c.content_hash)).fetchall():
+        if content_hash is None:
+            continue
+        text = read_corpus_blob(settings.CORPUS_DIR, content_hash)
+        if text is not None:
+            connection.execute(corpuses.update().where(corpuses.c.id == corpus_id).values(text=text))
@@ -1,31 +1,48 @@
 # app/api/endpoints.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request, Response
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from datetime import timedelta
-from app.db.db import get_db
-from app.cruds.cruds import create_corpus, get_corpus, get_all_corpuses, create_user, create_token  # Добавили create_token
+from typing import Optional
+import hashlib
+from app.db.db import get_async_db
+from app.cruds.async_cruds import (  # Обработчики не занимают пул потоков на время запросов к БД
+    create_corpus, get_corpus_hash, list_corpuses as list_corpus_page,
+    save_streamed_corpus,
+    create_user, create_token, revoke_token, get_user,
+)
 from app.schemas.schemas import (
-    CorpusUpload, CorpusResponse, CorpusItem, SearchRequest, SearchResponse, TokenRequest,
+    CorpusUpload, CorpusResponse, CorpusItem, CorpusListResponse, SearchRequest, SearchResponse, TokenRequest,
+    BatchSearchRequest,
     SearchResultItem, UserCreate, User as PydanticUser, Token
 )
-from app.auth.auth import authenticate_user, create_access_token, get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES
-from app.celery.tasks import fuzzy_search_task  # Добавили задачу Celery
+from app.auth.auth import authenticate_user_async, create_access_token, get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.celery.tasks import (  # Добавили задачу Celery
+    fuzzy_search_task, fuzzy_search_batch_task, build_symspell_index_task, result_cache, send_ws_notification, redis_client,
+)
+from app.services.result_cache import search_cache_key
+from app.services.blob_store import CorpusBlobWriter
+from app.services.vocabulary import TokenTooLongError, VocabularyBuilder
+from app.core.config import settings
+from app.core.metrics import ws_delivery_latency_ms
+from app.celery.notifications import read_publish_metrics
 from datetime import datetime
 from app.models.models import User as DBUser  # Alias for SQLAlchemy model
 
 router = APIRouter()
 
 @router.post("/register", response_model=PydanticUser)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(DBUser).filter(DBUser.username == user.username).first()
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await get_user(db, user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
-    return create_user(db, user.username, user.password)
+    # bcrypt считается в своём пуле потоков, а не в общем пуле синхронных обработчиков
+    return await create_user(db, user.username, user.password)
 
 @router.post("/login", response_model=Token)  # Переименовали /token в /login
-def login_for_access_token(user_data: TokenRequest, db: Session = Depends(get_db)):
-    user = authenticate_user(db, user_data.username, user_data.password)
+async def login_for_access_token(user_data: TokenRequest, db: AsyncSession = Depends(get_async_db)):
+    user = await authenticate_user_async(db, user_data.username, user_data.password)
     if not user:
         raise HTTPException(
             status_code=401,
@@ -33,30 +50,166 @@ def login_for_access_token(user_data: TokenRequest, db: Session = Depends(get_db
             headers={"WWW-Authenticate": "Bearer"},
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    # uid позволяет проверять токен без запроса к users (режим AUTH_STATELESS)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username, "uid": user.id}, expires_delta=access_token_expires
     )
     # Сохраняем токен в базе данных
     expires_at = datetime.utcnow() + access_token_expires
-    create_token(db, access_token, user.id, expires_at)
+    await create_token(db, access_token, user.id, expires_at)
     return {"access_token": access_token, "token_type": "bearer"}
 
+@router.post("/logout")
+async def logout(authorization: str = Header(None), db: AsyncSession = Depends(get_async_db), current_user: DBUser = Depends(get_current_user)):
+    # Токен отзывается в БД и сбрасывается из кэшей проверенных токенов
+    await revoke_token(db, authorization.split("Bearer ")[1])
+    return {"message": "Token revoked"}
+
 @router.post("/upload_corpus", response_model=CorpusResponse)
-def upload_corpus(corpus: CorpusUpload, db: Session = Depends(get_db), current_user: DBUser = Depends(get_current_user)):
-    db_corpus = create_corpus(db, corpus.corpus_name, corpus.text)
+async def upload_corpus(corpus: CorpusUpload, db: AsyncSession = Depends(get_async_db), current_user: DBUser = Depends(get_current_user)):
+    # Каждая загрузка создаёт новый корпус: корпуса не привязаны к пользователям,
+    # и замена по имени позволила бы перезаписать чужой корпус
+    db_corpus = await create_corpus(db, corpus.corpus_name, corpus.text)
+    # Индекс SymSpell строится в фоне, поиск до его готовности идёт перебором.
+    # Клиенты Redis и брокера синхронные, поэтому вызываются из пула потоков
+    await run_in_threadpool(build_symspell_index_task.delay, db_corpus.id, db_corpus.content_hash)
+    return CorpusResponse(corpus_id=db_corpus.id, message="Corpus uploaded successfully")
+
+@router.post("/upload_corpus_stream", response_model=CorpusResponse)
+async def upload_corpus_stream(
+    request: Request, corpus_name: str,
+    db: AsyncSession = Depends(get_async_db), current_user: DBUser = Depends(get_current_user),
+):
+    # Тело запроса - сам текст корпуса (text/plain, можно chunked). Он читается по кускам:
+    # каждый кусок сжимается в файл и сразу разбирается на токены, текст целиком в памяти не бывает
+    writer = CorpusBlobWriter(settings.CORPUS_DIR, settings.CORPUS_COMPRESSION)
+    builder = VocabularyBuilder(settings.MAX_TOKEN_LENGTH)
+
+    def ingest(chunk: bytes):
+        writer.write(chunk)
+        builder.feed_bytes(chunk)
+
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                await run_in_threadpool(ingest, chunk)
+        vocabulary = await run_in_threadpool(builder.finish)
+        content_hash = await run_in_threadpool(writer.finish)
+    except UnicodeDecodeError:
+        writer.abort()
+        raise HTTPException(status_code=400, detail="Corpus text must be UTF-8")
+    except TokenTooLongError as e:
+        writer.abort()
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        writer.abort()
+        raise
+
+    db_corpus = await save_streamed_corpus(db, corpus_name, content_hash, vocabulary)
+    await run_in_threadpool(build_symspell_index_task.delay, db_corpus.id, db_corpus.content_hash)
     return CorpusResponse(corpus_id=db_corpus.id, message="Corpus uploaded successfully")
 
-@router.get("/corpuses")
-def list_corpuses(db: Session = Depends(get_db), current_user: DBUser = Depends(get_current_user)):
-    corpuses = get_all_corpuses(db)
-    return {"corpuses": [CorpusItem(id=c.id, name=c.name) for c in corpuses]}
+@router.get("/corpuses", response_model=CorpusListResponse)
+async def list_corpuses(
+    response: Response,
+    after_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    name_prefix: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: DBUser = Depends(get_current_user),
+):
+    # Лишняя строка показывает, есть ли следующая страница
+    rows = await list_corpus_page(db, after_id, limit + 1, name_prefix)
+    next_after_id = rows[limit - 1].id if len(rows) > limit else None
+    corpuses = [CorpusItem(id=row.id, name=row.name) for row in rows[:limit]]
+
+    # ETag - хеш содержимого страницы: клиент, опрашивающий список, при неизменной странице
+    # получает пустой 304 вместо повторной передачи
+    digest = hashlib.sha1(repr(([(c.id, c.name) for c in corpuses], next_after_id)).encode("utf-8")).hexdigest()
+    etag = f'"{digest}"'
+    if if_none_match is not None and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return CorpusListResponse(corpuses=corpuses, next_after_id=next_after_id)
 
 @router.post("/search_algorithm")
-def search_algorithm(search: SearchRequest, db: Session = Depends(get_db), current_user: DBUser = Depends(get_current_user)):
-    corpus = get_corpus(db, search.corpus_id)
-    if not corpus:
+async def search_algorithm(search: SearchRequest, db: AsyncSession = Depends(get_async_db), current_user: DBUser = Depends(get_current_user)):
+    content_hash = await get_corpus_hash(db, search.corpus_id)
+    if content_hash is None:
         raise HTTPException(status_code=404, detail="Corpus not found")
     
-    # Запускаем задачу Celery
-    task = fuzzy_search_task.delay(current_user.id, search.word, corpus.text, search.algorithm)
-    return {"task_id": task.id, "message": "Search task started. Connect to WebSocket to receive updates."}
\ No newline at end of file
+    # Такой же запрос к тому же содержимому корпуса уже считался: отвечаем сразу, без задачи
+    cache_key = search_cache_key(
+        search.corpus_id, content_hash, search.word, search.algorithm, search.max_distance, search.top_k,
+    )
+    cached = await run_in_threadpool(result_cache.get, cache_key)
+    if cached is not None:
+        await run_in_threadpool(send_ws_notification, current_user.id, {
+            "status": "COMPLETED",
+            "task_id": None,
+            "seq": 1,
+            "cached": True,
+            "execution_time": 0.0,
+            "results": cached["results"],
+        })
+        return {"task_id": None, "cached": True, "results": cached["results"], "message": "Search result served from cache."}
+    
+    # Запускаем задачу Celery: через брокер идёт только corpus_id, текст воркер берёт сам
+    task = await run_in_threadpool(
+        fuzzy_search_task.delay, current_user.id, search.word, search.corpus_id, search.algorithm, search.engine,
+        search.max_distance, search.top_k, search.shards, content_hash, search.stream,
+    )
+    return {"task_id": task.id, "message": "Search task started. Connect to WebSocket to receive updates."}
+
+@router.post("/search_batch")
+async def search_batch(search: BatchSearchRequest, db: AsyncSession = Depends(get_async_db), current_user: DBUser = Depends(get_current_user)):
+    words = search.query_words()
+    if not words:
+        raise HTTPException(status_code=400, detail="No words to search")
+    if len(words) > settings.BATCH_SEARCH_MAX_WORDS:
+        raise HTTPException(status_code=400, detail=f"Too many words: at most {settings.BATCH_SEARCH_MAX_WORDS}")
+    content_hash = await get_corpus_hash(db, search.corpus_id)
+    if content_hash is None:
+        raise HTTPException(status_code=404, detail="Corpus not found")
+
+    # Все слова уже искались в этом содержимом корпуса - отвечаем из кэша, без задачи.
+    # Иначе в задачу уходит весь пакет, закэшированные слова воркер заново не считает
+    def cached_results():
+        results = []
+        for word in words:
+            cached = result_cache.get(search_cache_key(
+                search.corpus_id, content_hash, word, search.algorithm, search.max_distance, search.top_k,
+            ))
+            if cached is None:
+                return None
+            results.append({"query": word, "results": cached["results"]})
+        return results
+
+    results = await run_in_threadpool(cached_results)
+    if results is not None:
+        await run_in_threadpool(send_ws_notification, current_user.id, {
+            "status": "COMPLETED",
+            "task_id": None,
+            "batch": True,
+            "seq": 1,
+            "cached": True,
+            "cached_words": len(words),
+            "execution_time": 0.0,
+            "results": results,
+        })
+        return {"task_id": None, "cached": True, "results": results, "message": "Search result served from cache."}
+
+    task = await run_in_threadpool(
+        fuzzy_search_batch_task.delay, current_user.id, words, search.corpus_id, search.algorithm, search.engine,
+        search.max_distance, search.top_k, content_hash,
+    )
+    return {"task_id": task.id, "words": len(words), "message": "Batch search task started. Connect to WebSocket to receive updates."}
+
+@router.get("/metrics")
+async def metrics(current_user: DBUser = Depends(get_current_user)):
+    return {
+        "ws_delivery_latency_ms": ws_delivery_latency_ms.snapshot(),
+        # Счётчики публикаций уведомлений воркерами (общие для всех воркеров, хранятся в Redis)
+        "notifications": await run_in_threadpool(read_publish_metrics, redis_client),
+    }
\ No newline at end of file
@@ -1,33 +1,85 @@
 # app/auth/auth.py
+import asyncio
+import secrets
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import Depends, HTTPException, status, Header
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.db.db import get_db  # Абсолютный импорт
+from app.db.db import AsyncSessionLocal, get_async_db  # Абсолютный импорт
 from app.models.models import User  # Абсолютный импорт
 from app.schemas.schemas import TokenData  # Абсолютный импорт
 from app.core.config import settings  # Импортируем настройки
+from app.auth.token_cache import TokenCache, UserSnapshot, publish_token_revoked, publish_user_changed
+import redis
 
 # Настройки для JWT берём из конфига
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 
-# Настройка хеширования паролей
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Настройка хеширования паролей: стоимость bcrypt берётся из конфига,
+# хеши с другой стоимостью пересчитываются при следующем входе (см. authenticate_user_async)
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+# Отдельный ограниченный пул для bcrypt: всплеск входов занимает только его,
+# а не общий пул потоков, в котором выполняются синхронные обработчики
+password_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
 
 # Настройка OAuth2
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+# Проверенные токены процесса API: токен -> снимок пользователя
+token_cache = TokenCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL)
+
+# Клиент для рассылки инвалидаций другим процессам API (подключается при первой публикации)
+redis_client = redis.Redis.from_url(settings.REDIS_URL)
+
+def invalidate_token(token: str):
+    # Вызывается после отзыва токена в БД
+    token_cache.invalidate_token(token)
+    try:
+        publish_token_revoked(redis_client, token)
+    except redis.RedisError as e:
+        print(f"Failed to publish token revocation: {e}")
+
+def invalidate_user(user_id: int):
+    # Вызывается после изменения is_active пользователя в БД
+    token_cache.invalidate_user(user_id)
+    try:
+        publish_user_changed(redis_client, user_id)
+    except redis.RedisError as e:
+        print(f"Failed to publish user invalidation: {e}")
+
+async def invalidate_token_async(token: str):
+    # Кэш меняется в цикле событий, а синхронная публикация в Redis уходит в поток
+    token_cache.invalidate_token(token)
+    try:
+        await asyncio.to_thread(publish_token_revoked, redis_client, token)
+    except redis.RedisError as e:
+        print(f"Failed to publish token revocation: {e}")
+
+async def invalidate_user_async(user_id: int):
+    token_cache.invalidate_user(user_id)
+    try:
+        await asyncio.to_thread(publish_user_changed, redis_client, user_id)
+    except redis.RedisError as e:
+        print(f"Failed to publish user invalidation: {e}")
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+async def get_password_hash_async(password):
+    return await asyncio.get_running_loop().run_in_executor(password_executor, get_password_hash, password)
+
 def get_user(db: Session, username: str):
     return db.query(User).filter(User.username == username).first()
 
@@ -39,17 +91,42 @@ def authenticate_user(db: Session, username: str, password: str):
         return False
     return user
 
+async def authenticate_user_async(db: AsyncSession, username: str, password: str):
+    from app.cruds.async_cruds import get_user as get_user_async  # Ленивый импорт: async_cruds импортирует auth
+
+    user = await get_user_async(db, username)
+    if not user:
+        return False
+    # Соединение возвращается в пул до ожидания bcrypt: иначе при всплеске входов все соединения
+    # заняты ждущими запросами, а остальные запросы ждут пул.
+    # close() отсоединяет user, но уже загруженные поля остаются доступны
+    await db.close()
+    # verify_and_update проверяет пароль и, если хеш устарел (needs_update: другая стоимость
+    # или схема), возвращает новый хеш - пароль в открытом виде есть только сейчас
+    verified, new_hash = await asyncio.get_running_loop().run_in_executor(
+        password_executor, pwd_context.verify_and_update, password, user.hashed_password,
+    )
+    if not verified:
+        return False
+    if new_hash is not None:
+        await db.execute(update(User).where(User.id == user.id).values(hashed_password=new_hash))
+        await db.commit()
+        user.hashed_password = new_hash
+    return user
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    # jti делает токены уникальными: два входа одного пользователя в одну секунду
+    # иначе дали бы одинаковый JWT и нарушили уникальность tokens.token
+    to_encode.update({"exp": expire, "jti": secrets.token_hex(8)})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(authorization: str = Header(None), db: Session = Depends(get_db)):
+async def get_current_user(authorization: str = Header(None), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -60,12 +137,32 @@ async def get_current_user(authorization: str = Header(None), db: Session = Depe
         raise credentials_exception
 
     token = authorization.split("Bearer ")[1]
+
+    if settings.AUTH_STATELESS:
+        # Доверяем подписи и сроку действия JWT без обращения к БД.
+        # Отозванный токен в этом режиме работает до истечения срока
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            raise credentials_exception
+        username = payload.get("sub")
+        user_id = payload.get("uid")
+        if username is None:
+            raise credentials_exception
+        if user_id is not None:
+            return UserSnapshot(id=user_id, username=username)
+        # Токен выдан до появления uid - проверяем по БД как обычно
+
+    cached_user = token_cache.get(token)
+    if cached_user is not None:
+        return cached_user
+    generation = token_cache.generation
     
     # Ленивый импорт get_token для избежания циклической зависимости
-    from app.cruds.cruds import get_token
+    from app.cruds.async_cruds import get_token, get_user as get_user_async
     
     # Проверяем токен в базе данных
-    db_token = get_token(db, token)
+    db_token = await get_token(db, token)
     if not db_token:
         raise credentials_exception
     if not db_token.is_active:
@@ -91,10 +188,20 @@ async def get_current_user(authorization: str = Header(None), db: Session = Depe
     except JWTError:
         raise credentials_exception
     
-    user = get_user(db, username=token_data.username)
+    user = await get_user_async(db, username=token_data.username)
     if user is None:
         raise credentials_exception
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     
-    return user
\ No newline at end of file
+    # Следующие запросы с этим токеном обойдутся без БД, пока запись не устареет или не будет сброшена
+    snapshot = UserSnapshot(id=user.id, username=user.username, is_active=user.is_active)
+    token_cache.set(token, snapshot, db_token.expires_at, generation)
+    return snapshot
+
+async def get_current_user_short_session(authorization: str = Header(None)):
+    # Для долгоживущих соединений (WebSocket): сессия открывается только на проверку токена.
+    # Зависимость get_async_db держала бы соединение из пула, пока открыт сокет,
+    # и сокетов больше, чем DB_POOL_SIZE + DB_MAX_OVERFLOW, хватило бы, чтобы занять весь пул
+    async with AsyncSessionLocal() as db:
+        return await get_current_user(authorization, db)
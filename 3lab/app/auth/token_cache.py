@@ -0,0 +1,110 @@
+# app/auth/token_cache.py
+import asyncio
+import hashlib
+from datetime import datetime
+from typing import Optional
+from app.services.cache import LRUCache
+
+INVALIDATION_CHANNEL = "auth_invalidations"
+
+
+def token_key(token: str) -> str:
+    # Токен хранится в кэше и рассылается только в виде sha256: сам JWT - действующий пароль,
+    # его не должно быть ни в памяти кэша, ни в канале, который читает любой подписчик Redis
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+# Снимок пользователя, которому принадлежит проверенный токен.
+# Хранится в кэше вместо ORM-объекта: тот привязан к сессии запроса
+class UserSnapshot:
+    def __init__(self, id: int, username: str, is_active: bool = True):
+        self.id = id
+        self.username = username
+        self.is_active = is_active
+
+
+# Кэш проверенных токенов в памяти процесса API: sha256 токена -> (снимок пользователя, срок действия токена).
+# Попадание избавляет get_current_user от двух запросов (tokens и users) на каждый запрос.
+# Отзыв токена и блокировка пользователя рассылаются через Redis-канал auth_invalidations
+# всем процессам API; если подписка недоступна, запись всё равно живёт не дольше ttl
+class TokenCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.entries = LRUCache(maxsize, ttl)
+        self.listener_task: Optional[asyncio.Task] = None
+        # Растёт при каждой инвалидации: запись, проверенная по БД до инвалидации, в кэш не попадёт
+        self.generation = 0
+
+    def get(self, token: str) -> Optional[UserSnapshot]:
+        key = token_key(token)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        user, expires_at = entry
+        if expires_at is not None and expires_at < datetime.utcnow():
+            self.entries.pop(key)
+            return None
+        return user
+
+    def set(self, token: str, user: UserSnapshot, expires_at: Optional[datetime], generation: Optional[int] = None):
+        if generation is not None and generation != self.generation:
+            return
+        self.entries.set(token_key(token), (user, expires_at))
+
+    def invalidate_token(self, token: str):
+        self.invalidate_key(token_key(token))
+
+    def invalidate_key(self, key: str):
+        self.generation += 1
+        self.entries.pop(key)
+
+    def invalidate_user(self, user_id: int):
+        # Событие редкое, а кэш ограничен по размеру: проще пройти его целиком, чем держать обратный индекс
+        self.generation += 1
+        for token, (user, _) in list(self.entries.data.items()):
+            if user.id == user_id:
+                self.entries.pop(token)
+
+    def apply(self, message: str):
+        # Формат сообщения: "token:<sha256 токена>" или "user:<id>"
+        kind, _, value = message.partition(":")
+        if kind == "token":
+            self.invalidate_key(value)
+        elif kind == "user":
+            self.invalidate_user(int(value))
+
+    async def start(self, redis_client):
+        if self.listener_task is None or self.listener_task.done():
+            self.listener_task = asyncio.create_task(self._listen(redis_client))
+
+    async def stop(self):
+        if self.listener_task is not None:
+            self.listener_task.cancel()
+            await asyncio.gather(self.listener_task, return_exceptions=True)
+            self.listener_task = None
+
+    async def _listen(self, redis_client):
+        while True:
+            pubsub = redis_client.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.apply(message["data"].decode("utf-8"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Пока подписки нет, сообщения об отзыве теряются: сбрасываем кэш целиком
+                print(f"Token cache invalidation listener error: {e}. Reconnecting in 1 second...")
+                self.generation += 1
+                self.entries.clear()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+
+def publish_token_revoked(redis_client, token: str):
+    redis_client.publish(INVALIDATION_CHANNEL, f"token:{token_key(token)}")
+
+
+def publish_user_changed(redis_client, user_id: int):
+    redis_client.publish(INVALIDATION_CHANNEL, f"user:{user_id}")
@@ -0,0 +1,86 @@
+# app/celery/notifications.py
+import time
+from typing import Dict, List, Optional, Tuple
+from app.core.codec import encode_message, resolve_encoding
+
+METRICS_KEY = "notify_metrics"
+
+
+# Статусы, промежуточные значения которых можно схлопывать: важно только последнее
+COALESCED_STATUSES = ("PROGRESS", "PARTIAL")
+
+
+# Публикация уведомлений воркера в Redis.
+# PROGRESS и PARTIAL одной задачи схлопываются: в пределах окна отправляется только
+# последнее значение (PARTIAL разных шардов схлопываются отдельно - клиент их объединяет).
+# Остальные статусы (STARTED, COMPLETED, FAILED...) не теряются никогда: перед ними
+# отправляются отложенные сообщения той же задачи, и всё уходит одним pipeline.
+# Счётчики публикаций копятся в Redis-хеше notify_metrics (его читает /metrics);
+# число схлопнутых сообщений считается локально и уходит с ближайшим pipeline
+class NotificationPublisher:
+    def __init__(self, redis_client, window: float, encoding: str = "json"):
+        self.redis_client = redis_client
+        self.window = window
+        self.encoding = resolve_encoding(encoding)
+        # task_id -> {(статус, шард): (user_id, последнее сообщение)}
+        self.pending: Dict[str, Dict[Tuple[str, Optional[int]], Tuple[int, dict]]] = {}
+        # task_id -> {(статус, шард): время последней отправки}
+        self.last_sent: Dict[str, Dict[Tuple[str, Optional[int]], float]] = {}
+        # Сколько отложенных сообщений заменено более свежими и ещё не учтено в Redis
+        self.coalesced = 0
+
+    def publish(self, user_id: int, message: dict):
+        task_id = message.get("task_id")
+        status = message.get("status")
+        if status in COALESCED_STATUSES and task_id is not None:
+            key = (status, message.get("shard"))
+            pending = self.pending.setdefault(task_id, {})
+            if key in pending:
+                self.coalesced += 1
+            pending[key] = (user_id, message)
+            last_sent = self.last_sent.setdefault(task_id, {})
+            if time.monotonic() - last_sent.get(key, float("-inf")) >= self.window:
+                del pending[key]
+                last_sent[key] = time.monotonic()
+                self._send([(user_id, message)])
+            return
+
+        batch = []
+        if task_id is not None:
+            # Задача закончила присылать промежуточные сообщения
+            batch = list(self.pending.pop(task_id, {}).values())
+            self.last_sent.pop(task_id, None)
+        batch.append((user_id, message))
+        self._send(batch)
+
+    def flush(self, task_id: Optional[str] = None):
+        # Отправляет отложенные сообщения задачи (или всех задач) и забывает её окна.
+        # Нужен там, где задача в этом процессе заканчивается без финального статуса (шарды)
+        task_ids = list(self.pending) if task_id is None else [task_id]
+        batch = []
+        for pending_task_id in task_ids:
+            batch.extend(self.pending.pop(pending_task_id, {}).values())
+            self.last_sent.pop(pending_task_id, None)
+        self._send(batch)
+
+    def _send(self, batch: List[Tuple[int, dict]]):
+        if not batch:
+            return
+        pipe = self.redis_client.pipeline(transaction=False)
+        for user_id, message in batch:
+            # Время публикации нужно API для метрики задержки доставки до сокета
+            payload = encode_message({**message, "published_at": time.time()}, self.encoding)
+            pipe.publish(f"ws_notifications:{user_id}", payload)
+            pipe.hincrby(METRICS_KEY, f"published:{message.get('status', 'UNKNOWN')}", 1)
+        coalesced = self.coalesced
+        if coalesced:
+            pipe.hincrby(METRICS_KEY, "coalesced", coalesced)
+        pipe.execute()
+        self.coalesced -= coalesced
+
+
+def read_publish_metrics(redis_client) -> Dict[str, int]:
+    return {
+        key.decode("utf-8"): int(value)
+        for key, value in redis_client.hgetall(METRICS_KEY).items()
+    }
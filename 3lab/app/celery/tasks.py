@@ -1,10 +1,22 @@
 # app/celery/tasks.py
-from celery import Celery
+from celery import Celery, chord
 from app.core.config import settings
-from app.services.services import fuzzy_search
+from app.services.services import fuzzy_search, fuzzy_search_batch, merge_search_results, symspell_answers
+from app.services.bktree import BKTree, load_or_build_bktree
+from app.services.symspell import SymSpellIndex, symspell_index_path
+from app.services.vocabulary import Vocabulary
+from app.services.vocabulary_file import MappedVocabulary, vocabulary_file_path, write_vocabulary_file
+from app.services.cache import LRUCache
+from app.services.result_cache import SearchResultCache, search_cache_key
+from app.db.db import SessionLocal, ReadSessionLocal
+from app.cruds.cruds import get_corpus_vocabulary_and_hash, get_corpus_hash
+from app.celery.notifications import METRICS_KEY, NotificationPublisher
+import itertools
+from contextlib import contextmanager
+import os
 import time
-import json
 import redis
+from typing import Optional, Union
 
 celery_app = Celery(
     "tasks",
@@ -26,52 +38,489 @@ celery_app.conf.update(
 # Подключаемся к Redis для публикации сообщений
 redis_client = redis.Redis.from_url(settings.REDIS_URL)
 
+# Кэш результатов поиска: воркер кладёт туда готовый результат, API отдаёт его без задачи
+result_cache = SearchResultCache(redis_client, settings.SEARCH_CACHE_TTL, settings.SEARCH_CACHE_LOCAL_SIZE)
+
+# Словари корпусов, уже загруженные в этом процессе воркера: (corpus_id, content_hash) -> Vocabulary.
+# Через брокер передаётся только corpus_id, а словарь читается из БД один раз;
+# хеш в ключе не даёт использовать словарь корпуса, загруженного заново
+vocabularies = LRUCache(settings.CORPUS_CACHE_SIZE)
+
+class CorpusChangedError(RuntimeError):
+    pass
+
+def load_vocabulary(corpus_id: int, content_hash: Optional[str] = None) -> Optional[Vocabulary]:
+    # content_hash - хеш, с которым поставлена задача. Словарь из БД берётся, только если
+    # корпус всё ещё хранит это содержимое: файлы словаря и индексов адресуются хешем
+    # и общие для всех корпусов, поэтому под чужим хешем их писать нельзя
+    vocabulary = vocabularies.get((corpus_id, content_hash))
+    if vocabulary is None and settings.VOCABULARY_MMAP and content_hash is not None:
+        # Файл словаря по хешу содержимого: отображается в память, а не читается в кучу,
+        # поэтому все воркеры машины делят одну копию в кэше страниц ОС
+        vocabulary = MappedVocabulary.open(vocabulary_file_path(settings.INDEX_DIR, content_hash))
+        if vocabulary is not None:
+            vocabularies.set((corpus_id, content_hash), vocabulary)
+    if vocabulary is None:
+        # Словарь читается через соединение только для чтения; писать нужно лишь для
+        # корпусов, загруженных до появления словарей (их словарь строится и сохраняется)
+        db = ReadSessionLocal()
+        try:
+            vocabulary, stored_hash = get_corpus_vocabulary_and_hash(db, corpus_id, build_missing=False)
+        finally:
+            db.close()
+        if vocabulary is None:
+            db = SessionLocal()
+            try:
+                vocabulary, stored_hash = get_corpus_vocabulary_and_hash(db, corpus_id)
+            finally:
+                db.close()
+        if vocabulary is None:
+            return None
+        if content_hash is not None and stored_hash != content_hash:
+            # Корпус перезагружен после постановки задачи: старого содержимого в БД уже нет
+            raise CorpusChangedError(f"Corpus {corpus_id} was re-uploaded; repeat the search")
+        if settings.VOCABULARY_MMAP and content_hash is not None:
+            # Первый воркер, которому понадобился корпус, пишет файл словаря
+            # и сам переходит на отображение вместо только что прочитанных списков
+            path = vocabulary_file_path(settings.INDEX_DIR, content_hash)
+            write_vocabulary_file(path, vocabulary)
+            vocabulary = MappedVocabulary.open(path) or vocabulary
+        vocabularies.set((corpus_id, content_hash), vocabulary)
+    return vocabulary
+
+def index_key(corpus_id: int, content_hash: Optional[str]) -> str:
+    # Индексы на диске адресуются хешем содержимого; без хеша (старые задачи) - по id
+    return content_hash if content_hash is not None else f"corpus_{corpus_id}"
+
+# BK-деревья, уже поднятые в этом процессе воркера: ключ индекса -> дерево
+bktrees = LRUCache(settings.CORPUS_CACHE_SIZE)
+
+def get_bktree(key: str, vocabulary: Vocabulary) -> BKTree:
+    tree = bktrees.get(key)
+    if tree is None or len(tree.tokens) != len(vocabulary):
+        tree = load_or_build_bktree(settings.INDEX_DIR, key, vocabulary)
+        bktrees.set(key, tree)
+    return tree
+
+# Индексы SymSpell, уже загруженные в этом процессе воркера: ключ индекса -> индекс
+symspell_indexes = LRUCache(settings.CORPUS_CACHE_SIZE)
+# Ключи, для которых этот воркер уже поставил перестройку испорченного файла индекса
+symspell_rebuilds = set()
+
+def get_symspell_index(corpus_id: int, content_hash: Optional[str], vocabulary: Vocabulary) -> Optional[SymSpellIndex]:
+    # Индекс строит build_symspell_index_task; пока его нет, поиск идёт перебором
+    key = index_key(corpus_id, content_hash)
+    index = symspell_indexes.get(key)
+    if index is None or len(index.vocabulary) != len(vocabulary):
+        path = symspell_index_path(settings.INDEX_DIR, key)
+        if not os.path.exists(path):
+            return None
+        index = SymSpellIndex.load(path, vocabulary)
+        if index is None:
+            # Файл есть, но не читается: считаем индекс отсутствующим и строим заново
+            if key not in symspell_rebuilds:
+                symspell_rebuilds.add(key)
+                build_symspell_index_task.delay(corpus_id, content_hash)
+            return None
+        symspell_rebuilds.discard(key)
+        symspell_indexes.set(key, index)
+    return index
+
+# Публикатор уведомлений: PROGRESS одной задачи схлопываются в окне 1 / PROGRESS_EVENTS_PER_SECOND,
+# остальные статусы отправляются всегда (см. notifications.py)
+notification_publisher = NotificationPublisher(
+    redis_client,
+    1.0 / settings.PROGRESS_EVENTS_PER_SECOND if settings.PROGRESS_EVENTS_PER_SECOND > 0 else 0.0,
+    settings.NOTIFY_ENCODING,
+)
+
 def send_ws_notification(user_id: int, message: dict):
-    # Публикуем сообщение в Redis-канал
-    channel = f"ws_notifications:{user_id}"
-    redis_client.publish(channel, json.dumps(message))
-    print(f"Published to Redis channel {channel}: {message}")
+    # Публикуем сообщение в Redis-канал ws_notifications:{user_id}
+    notification_publisher.publish(user_id, message)
+    if message.get("status") != "PROGRESS":
+        print(f"Published to Redis channel ws_notifications:{user_id}: {message.get('status')} {message.get('task_id')}")
+
+@contextmanager
+def task_failures(user_id: int, task_id: str, report: bool = True):
+    # Исключение в задаче клиент видит как FAILED (report=False - сообщит кто-то другой,
+    # как обработчик ошибки chord для шардов). Отложенные сообщения задачи и её окна
+    # схлопывания не остаются в публикаторе после конца задачи, как бы она ни закончилась
+    try:
+        yield
+    except Exception as e:
+        if report:
+            send_ws_notification(user_id, {
+                "status": "FAILED",
+                "task_id": task_id,
+                "error": str(e),
+            })
+        raise
+    finally:
+        notification_publisher.flush(task_id)
+
+class ProgressThrottle:
+    # Ограничивает частоту PROGRESS-событий по времени; последнее (processed == total) проходит всегда
+    def __init__(self, events_per_second: Optional[float] = None):
+        if events_per_second is None:
+            events_per_second = settings.PROGRESS_EVENTS_PER_SECOND
+        self.interval = 1.0 / events_per_second if events_per_second > 0 else 0.0
+        self.last_sent = None
+
+    def ready(self, processed: int, total: int) -> bool:
+        now = time.monotonic()
+        if processed < total and self.last_sent is not None and now - self.last_sent < self.interval:
+            return False
+        self.last_sent = now
+        return True
+
+# Общий прогресс шардов одной задачи: счётчик обработанных токенов в Redis.
+# Скрипт атомарно прибавляет долю шарда и публикует PROGRESS, только если процент вырос,
+# поэтому клиент видит один монотонный поток 0-100% независимо от порядка шардов.
+# Публикация идёт мимо NotificationPublisher, поэтому счётчик для /metrics скрипт ведёт сам (KEYS[2])
+SHARD_PROGRESS_SCRIPT = redis_client.register_script("""
+local done = redis.call('HINCRBY', KEYS[1], 'done', ARGV[1])
+local total = tonumber(ARGV[2])
+local progress = math.floor(done * 100 / total)
+if progress > 100 then progress = 100 end
+local last = tonumber(redis.call('HGET', KEYS[1], 'last') or '-1')
+redis.call('EXPIRE', KEYS[1], 3600)
+if progress <= last then
+    return -1
+end
+redis.call('HSET', KEYS[1], 'last', progress)
+local now = redis.call('TIME')
+redis.call('PUBLISH', ARGV[3], cjson.encode({
+    status = 'PROGRESS',
+    task_id = ARGV[4],
+    progress = progress,
+    current_word = 'processing word ' .. math.min(done, total) .. '/' .. total,
+    published_at = tonumber(now[1]) + tonumber(now[2]) / 1000000,
+}))
+redis.call('HINCRBY', KEYS[2], 'published:PROGRESS', 1)
+return progress
+""")
+
+def shard_progress_key(task_id: str) -> str:
+    return f"search_progress:{task_id}"
+
+def next_shard_seq(task_id: str) -> int:
+    # Номер сообщения задачи, общий для всех её шардов (хранится рядом со счётчиком прогресса)
+    pipe = redis_client.pipeline()
+    pipe.hincrby(shard_progress_key(task_id), "seq", 1)
+    pipe.expire(shard_progress_key(task_id), 3600)
+    return pipe.execute()[0]
+
+def format_results(results) -> list:
+    return [{"word": w, "distance": d, "count": c} for w, d, c in results]
+
+def report_shard_progress(user_id: int, task_id: str, delta: int, total: int):
+    if delta <= 0 or total <= 0:
+        return
+    SHARD_PROGRESS_SCRIPT(
+        keys=[shard_progress_key(task_id), METRICS_KEY],
+        args=[delta, total, f"ws_notifications:{user_id}", task_id],
+    )
 
 @celery_app.task(bind=True)
-def fuzzy_search_task(self, user_id: int, word: str, text: str, algorithm: str):
-    print(f"Task started: {self.request.id}, user_id: {user_id}, word: {word}, algorithm: {algorithm}")
+def fuzzy_search_task(
+    self, user_id: int, word: str, corpus_id: Union[int, str], algorithm: str, engine: str = "python",
+    max_distance: Optional[int] = None, top_k: int = 10, shards: int = 1,
+    content_hash: Optional[str] = None, stream: bool = False,
+):
+    with task_failures(user_id, self.request.id):
+        text = None
+        if isinstance(corpus_id, str):
+            # Задача поставлена в старом формате: третьим аргументом пришёл весь текст корпуса
+            text, corpus_id = corpus_id, None
+
+        print(f"Task started: {self.request.id}, user_id: {user_id}, word: {word}, algorithm: {algorithm}")
     
-    start_message = {
-        "status": "STARTED",
-        "task_id": self.request.id,
-        "word": word,
-        "algorithm": algorithm,
-    }
-    send_ws_notification(user_id, start_message)
+        start_message = {
+            "status": "STARTED",
+            "task_id": self.request.id,
+            "word": word,
+            "algorithm": algorithm,
+            "engine": engine,
+            "max_distance": max_distance,
+            "top_k": top_k,
+            "shards": shards,
+            "stream": stream,
+        }
+        send_ws_notification(user_id, start_message)
 
-    words = text.split()
-    total_words = len(words)
-    results = []
+        if shards > 1 and corpus_id is not None and algorithm != "symspell":
+            # Словарь делится на шарды, каждый ищется отдельной подзадачей на любом свободном
+            # воркере; merge_search_shards_task сливает топы шардов и отправляет COMPLETED
+            header = [
+                fuzzy_search_shard_task.s(
+                    user_id, self.request.id, corpus_id, word, algorithm, engine,
+                    max_distance, top_k, shard_index, shards, content_hash, stream,
+                )
+                for shard_index in range(shards)
+            ]
+            cache_key = None
+            if content_hash is not None:
+                cache_key = search_cache_key(corpus_id, content_hash, word, algorithm, max_distance, top_k)
+            # Упавший шард ломает chord: тогда вместо слияния вызывается search_shards_failed_task
+            # и клиент получает FAILED, а не ждёт COMPLETED вечно
+            body = merge_search_shards_task.s(
+                user_id, self.request.id, top_k, time.time(), corpus_id, cache_key,
+            ).on_error(search_shards_failed_task.s(user_id, self.request.id))
+            chord(header)(body)
+            return {"status": "DISPATCHED", "task_id": self.request.id, "shards": shards}
 
-    for i, current_word in enumerate(words):
-        time.sleep(0.1)
-        if (i + 1) % 10 == 0 or i == total_words - 1:
-            progress = int(((i + 1) / total_words) * 100)
-            progress_message = {
-                "status": "PROGRESS",
+        start_time = time.time()
+        vocabulary = Vocabulary.from_text(text) if text is not None else load_vocabulary(corpus_id, content_hash)
+        if vocabulary is None:
+            error_message = {
+                "status": "FAILED",
                 "task_id": self.request.id,
-                "progress": progress,
-                "current_word": f"processing word {i + 1}/{total_words}",
+                "error": "Corpus not found",
             }
-            send_ws_notification(user_id, progress_message)
+            send_ws_notification(user_id, error_message)
+            return error_message
+        symspell = None
+        if algorithm == "symspell" and corpus_id is not None:
+            symspell = get_symspell_index(corpus_id, content_hash, vocabulary)
+        bktree = None
+        # BK-дерево не нужно, если запрос целиком отвечает индекс SymSpell
+        if max_distance is not None and corpus_id is not None and not symspell_answers(symspell, max_distance):
+            bktree = get_bktree(index_key(corpus_id, content_hash), vocabulary)
 
-    start_time = time.time()
-    results = fuzzy_search(word, text, algorithm)
-    execution_time = time.time() - start_time
+        def progress(processed: int, total: int):
+            # Прогресс идёт от настоящего перебора словаря, а не от отдельного прохода по корпусу;
+            # частые вызовы схлопывает публикатор, до Redis доходит только последнее значение в окне
+            send_ws_notification(user_id, {
+                "status": "PROGRESS",
+                "task_id": self.request.id,
+                "progress": int(processed / total * 100) if total else 100,
+                "current_word": f"processing word {processed}/{total}",
+            })
+
+        # Номера сообщений с результатами: клиент по ним отличает свежий топ от устаревшего
+        sequence = itertools.count(1)
+
+        def partial(results):
+            # Промежуточный топ по уже просмотренной части словаря (режим stream)
+            send_ws_notification(user_id, {
+                "status": "PARTIAL",
+                "task_id": self.request.id,
+                "seq": next(sequence),
+                "results": format_results(results),
+            })
+
+        stats = {}
+        results = fuzzy_search(
+            word, vocabulary, algorithm, engine, max_distance, top_k,
+            bktree=bktree, stats=stats, symspell=symspell, progress=progress,
+            partial=partial if stream else None,
+        )
+        execution_time = time.time() - start_time
+
+        result_message = {
+            "status": "COMPLETED",
+            "task_id": self.request.id,
+            "seq": next(sequence),
+            "execution_time": execution_time,
+            "visited": stats.get("visited"),
+            "vocabulary_size": len(vocabulary),
+            "results": format_results(results),
+        }
+        send_ws_notification(user_id, result_message)
+        if content_hash is not None:
+            result_cache.set(
+                search_cache_key(corpus_id, content_hash, word, algorithm, max_distance, top_k),
+                corpus_id, {"results": result_message["results"]},
+            )
+
+        return result_message
+
+@celery_app.task(bind=True)
+def fuzzy_search_batch_task(
+    self, user_id: int, words: list, corpus_id: int, algorithm: str, engine: str = "python",
+    max_distance: Optional[int] = None, top_k: int = 10, content_hash: Optional[str] = None,
+):
+    # Несколько слов за один проход по словарю; прогресс и результат - по всему пакету
+    with task_failures(user_id, self.request.id):
+        print(f"Batch task started: {self.request.id}, user_id: {user_id}, words: {len(words)}, algorithm: {algorithm}")
+
+        send_ws_notification(user_id, {
+            "status": "STARTED",
+            "task_id": self.request.id,
+            "batch": True,
+            "words": words,
+            "algorithm": algorithm,
+            "engine": engine,
+            "max_distance": max_distance,
+            "top_k": top_k,
+        })
+
+        start_time = time.time()
+        # Слова, уже посчитанные для этого содержимого корпуса, берутся из кэша результатов
+        cache_keys = {}
+        results = {}
+        if content_hash is not None:
+            for word in words:
+                cache_keys[word] = search_cache_key(corpus_id, content_hash, word, algorithm, max_distance, top_k)
+                cached = result_cache.get(cache_keys[word])
+                if cached is not None:
+                    results[word] = cached["results"]
+        pending = [word for word in words if word not in results]
+
+        stats = {}
+        vocabulary = None
+        if pending:
+            vocabulary = load_vocabulary(corpus_id, content_hash)
+            if vocabulary is None:
+                error_message = {
+                    "status": "FAILED",
+                    "task_id": self.request.id,
+                    "error": "Corpus not found",
+                }
+                send_ws_notification(user_id, error_message)
+                return error_message
+            symspell = None
+            if algorithm == "symspell":
+                symspell = get_symspell_index(corpus_id, content_hash, vocabulary)
+            bktree = None
+            if max_distance is not None and not symspell_answers(symspell, max_distance):
+                bktree = get_bktree(index_key(corpus_id, content_hash), vocabulary)
+
+            def progress(processed: int, total: int):
+                send_ws_notification(user_id, {
+                    "status": "PROGRESS",
+                    "task_id": self.request.id,
+                    "progress": int(processed / total * 100) if total else 100,
+                    "current_word": f"processing {len(pending)} words: {processed}/{total}",
+                })
+
+            found = fuzzy_search_batch(
+                pending, vocabulary, algorithm, engine, max_distance, top_k,
+                bktree=bktree, stats=stats, symspell=symspell, progress=progress,
+            )
+            for word, word_results in zip(pending, found):
+                results[word] = format_results(word_results)
+                if word in cache_keys:
+                    result_cache.set(cache_keys[word], corpus_id, {"results": results[word]})
+        execution_time = time.time() - start_time
+
+        result_message = {
+            "status": "COMPLETED",
+            "task_id": self.request.id,
+            "batch": True,
+            "seq": 1,
+            "execution_time": execution_time,
+            "visited": stats.get("visited", 0),
+            "cached_words": len(words) - len(pending),
+            "vocabulary_size": len(vocabulary) if vocabulary is not None else None,
+            "results": [{"query": word, "results": results[word]} for word in words],
+        }
+        send_ws_notification(user_id, result_message)
+        return result_message
+
+@celery_app.task
+def fuzzy_search_shard_task(
+    user_id: int, parent_task_id: str, corpus_id: int, word: str, algorithm: str, engine: str,
+    max_distance: Optional[int], top_k: Optional[int], shard_index: int, shard_count: int,
+    content_hash: Optional[str] = None, stream: bool = False,
+):
+    with task_failures(user_id, parent_task_id, report=False):
+        vocabulary = load_vocabulary(corpus_id, content_hash)
+        if vocabulary is None:
+            return []
+
+        shard = vocabulary.shard(shard_index, shard_count)
+        total = len(vocabulary)
+        reported = 0
+        throttle = ProgressThrottle()
+
+        def progress(processed: int, shard_total: int):
+            nonlocal reported
+            if processed > reported and throttle.ready(processed, shard_total):
+                report_shard_progress(user_id, parent_task_id, processed - reported, total)
+                reported = processed
+
+        results = fuzzy_search(word, shard, algorithm, engine, max_distance, top_k, progress=progress)
+        if stream and results:
+            # Топ шарда уходит клиенту сразу, не дожидаясь остальных шардов;
+            # клиент объединяет топы шардов сам, итог всё равно придёт в COMPLETED
+            send_ws_notification(user_id, {
+                "status": "PARTIAL",
+                "task_id": parent_task_id,
+                "seq": next_shard_seq(parent_task_id),
+                "shard": shard_index,
+                "results": format_results(results),
+            })
+            notification_publisher.flush(parent_task_id)
+        # Позиция токена в полном словаре нужна слиянию, чтобы сохранить порядок равных расстояний
+        local_positions = {token: index for index, token in enumerate(shard.tokens)}
+        return [
+            (w, d, c, local_positions[w] * shard_count + shard_index)
+            for w, d, c in results
+        ]
+
+@celery_app.task
+def merge_search_shards_task(
+    shard_results: list, user_id: int, parent_task_id: str, top_k: Optional[int], started_at: float,
+    corpus_id: Optional[int] = None, cache_key: Optional[str] = None,
+):
+    results = merge_search_results(shard_results, top_k)
+    seq = next_shard_seq(parent_task_id)
+    redis_client.delete(shard_progress_key(parent_task_id))
 
     result_message = {
         "status": "COMPLETED",
-        "task_id": self.request.id,
-        "execution_time": execution_time,
-        "results": [
-            {"word": w, "distance": d} for w, d in results[:10]
-        ],
+        "task_id": parent_task_id,
+        "seq": seq,
+        "execution_time": time.time() - started_at,
+        "results": format_results(results),
     }
     send_ws_notification(user_id, result_message)
+    if cache_key is not None:
+        result_cache.set(cache_key, corpus_id, {"results": result_message["results"]})
+    return result_message
+
+@celery_app.task
+def search_shards_failed_task(request, exc, traceback, user_id: int, parent_task_id: str):
+    # Обработчик ошибки chord шардов: Celery передаёт запрос, исключение и traceback
+    redis_client.delete(shard_progress_key(parent_task_id))
+    send_ws_notification(user_id, {
+        "status": "FAILED",
+        "task_id": parent_task_id,
+        "error": str(exc),
+    })
+
+@celery_app.task
+def build_symspell_index_task(corpus_id: int, content_hash: Optional[str] = None):
+    # Строится вне пути запроса: запускается из /upload_corpus
+    if content_hash is None:
+        db = SessionLocal()
+        try:
+            content_hash = get_corpus_hash(db, corpus_id)
+        finally:
+            db.close()
+    try:
+        vocabulary = load_vocabulary(corpus_id, content_hash)
+    except CorpusChangedError:
+        # Индекс для нового содержимого построит задача, поставленная его загрузкой
+        return {"corpus_id": corpus_id, "status": "STALE"}
+    if vocabulary is None:
+        return {"corpus_id": corpus_id, "status": "NOT_FOUND"}
 
-    return result_message
\ No newline at end of file
+    max_memory_bytes = settings.SYMSPELL_MAX_MEMORY_MB * 1024 * 1024
+    try:
+        index = SymSpellIndex.build(
+            vocabulary, settings.SYMSPELL_MAX_DISTANCE, max_memory_bytes, settings.SYMSPELL_PREFIX_LENGTH,
+        )
+    except ValueError as e:
+        print(f"SymSpell index for corpus {corpus_id} not built: {e}")
+        return {"corpus_id": corpus_id, "status": "SKIPPED", "reason": str(e)}
+
+    index.save(symspell_index_path(settings.INDEX_DIR, index_key(corpus_id, content_hash)))
+    print(f"SymSpell index for corpus {corpus_id}: {len(index.deletes)} deletes, {index.memory_bytes} bytes")
+    return {
+        "corpus_id": corpus_id,
+        "status": "BUILT",
+        "deletes": len(index.deletes),
+        "memory_bytes": index.memory_bytes,
+    }
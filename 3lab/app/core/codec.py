@@ -0,0 +1,34 @@
+# app/core/codec.py
+import json
+from typing import Union
+
+try:
+    import msgpack
+except ImportError:  # msgpack не обязателен: без него всё передаётся в JSON
+    msgpack = None
+
+ENCODINGS = ("json", "msgpack")
+
+
+def resolve_encoding(encoding: str) -> str:
+    # msgpack запрошен, но не установлен - используем JSON
+    if encoding == "msgpack" and msgpack is not None:
+        return "msgpack"
+    return "json"
+
+
+def encode_message(message: dict, encoding: str = "json") -> Union[str, bytes]:
+    if resolve_encoding(encoding) == "msgpack":
+        return msgpack.packb(message, use_bin_type=True)
+    return json.dumps(message)
+
+
+def decode_message(data: Union[str, bytes]) -> dict:
+    # JSON-объект всегда начинается с "{", msgpack-словарь - с байта 0x80-0x8f/0xde/0xdf
+    if isinstance(data, str):
+        return json.loads(data)
+    if data[:1] == b"{":
+        return json.loads(data.decode("utf-8"))
+    if msgpack is None:
+        raise ValueError("msgpack payload received but msgpack is not installed")
+    return msgpack.unpackb(data, raw=False)
@@ -1,11 +1,46 @@
 # app/core/config.py
 from pydantic_settings import BaseSettings  # Изменили импорт
+from typing import Optional
 
 class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REDIS_URL: str = "redis://localhost:6379/0"
+    DATABASE_URL: str = "sqlite:///./corpus.db"  # Синхронный URL (воркеры, миграции)
+    # URL для async engine API; по умолчанию выводится из DATABASE_URL (sqlite+aiosqlite, postgresql+asyncpg)
+    ASYNC_DATABASE_URL: Optional[str] = None
+    # URL только для чтения (поисковые воркеры); по умолчанию тот же файл SQLite в режиме mode=ro
+    DATABASE_READ_URL: Optional[str] = None
+    DB_POOL_SIZE: int = 5  # Постоянных соединений в пуле каждого engine
+    DB_MAX_OVERFLOW: int = 10  # Сколько соединений можно открыть сверх пула при всплеске
+    DB_POOL_TIMEOUT: float = 30.0  # Сколько секунд ждать свободное соединение
+    SQLITE_WAL: bool = True  # Журнал WAL: чтение не блокируется записью
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # Сколько ждать блокировку, прежде чем вернуть "database is locked"
+    SQLITE_MMAP_SIZE: int = 268435456  # Сколько байт файла БД читать через mmap
+    SQLITE_CACHE_SIZE: int = -65536  # Кэш страниц; отрицательное значение - в КиБ (64 МиБ)
+    CORPUS_DIR: str = "./corpora"  # Сжатые тексты корпусов (имя файла - хеш содержимого)
+    CORPUS_COMPRESSION: str = "zstd"  # Сжатие текстов корпусов: zstd (если установлен zstandard) или zlib
+    MAX_TOKEN_LENGTH: int = 65536  # Самое длинное слово (в символах), которое примет потоковая загрузка корпуса
+    INDEX_DIR: str = "./indexes"  # Каталог для поисковых индексов корпусов (BK-деревья, SymSpell, файлы словарей)
+    VOCABULARY_MMAP: bool = True  # Воркеры читают словари из файлов в INDEX_DIR через mmap (общие страницы ОС)
+    SYMSPELL_MAX_DISTANCE: int = 2  # До какого расстояния строится индекс SymSpell
+    SYMSPELL_PREFIX_LENGTH: int = 7  # От скольких первых символов слова индекс SymSpell строит удаления
+    MAX_SHARDS: int = 16  # Больше шардов на один поиск запросить нельзя
+    CORPUS_CACHE_SIZE: int = 8  # Сколько корпусов (словарей и индексов) воркер держит в памяти
+    SEARCH_CACHE_TTL: int = 3600  # Сколько секунд хранится результат поиска (Redis и локально)
+    SEARCH_CACHE_LOCAL_SIZE: int = 1024  # Размер локального LRU-уровня кэша результатов в процессе API
+    WS_PING_INTERVAL: float = 5.0  # Период пингов в WebSocket, секунды
+    WS_QUEUE_SIZE: int = 100  # Сколько уведомлений ждут отправки в один сокет
+    PROGRESS_EVENTS_PER_SECOND: float = 5.0  # Не больше стольких PROGRESS-сообщений в секунду на задачу
+    BATCH_SEARCH_MAX_WORDS: int = 1000  # Сколько разных слов можно искать одним запросом /search_batch
+    SYMSPELL_MAX_MEMORY_MB: int = 256  # Индекс больше этого размера не строится
+    NOTIFY_ENCODING: str = "json"  # Формат уведомлений воркеров в Redis: json или msgpack
+    AUTH_CACHE_SIZE: int = 10000  # Сколько проверенных токенов держит в памяти процесс API
+    AUTH_CACHE_TTL: float = 60.0  # Сколько секунд токен считается проверенным без обращения к БД
+    BCRYPT_ROUNDS: int = 12  # Стоимость bcrypt (log2 числа раундов) для новых хешей паролей
+    PASSWORD_HASH_WORKERS: int = 4  # Потоков для bcrypt (хеширование и проверка паролей)
+    AUTH_STATELESS: bool = False  # Проверять только подпись и срок JWT, без БД (отзыв токенов не работает)
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,39 @@
+# app/core/metrics.py
+import threading
+from collections import deque
+from typing import Dict
+
+
+# Скользящее окно последних замеров: перцентили считаются по нему при запросе /metrics
+class LatencyWindow:
+    def __init__(self, size: int = 10000):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self.lock:
+            self.samples.append(value)
+            self.count += 1
+
+    def snapshot(self) -> Dict[str, float]:
+        with self.lock:
+            samples = sorted(self.samples)
+            count = self.count
+        if not samples:
+            return {"count": count}
+
+        def percentile(p: float) -> float:
+            return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+        return {
+            "count": count,
+            "p50": percentile(0.50),
+            "p90": percentile(0.90),
+            "p99": percentile(0.99),
+            "max": samples[-1],
+        }
+
+
+# Задержка доставки уведомления: от публикации в send_ws_notification до send_text в сокет, мс
+ws_delivery_latency_ms = LatencyWindow()
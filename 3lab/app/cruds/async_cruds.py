@@ -0,0 +1,98 @@
+# app/cruds/async_cruds.py
+# Асинхронные версии функций из cruds.py для слоя API (AsyncSession).
+# Воркеры Celery по-прежнему пользуются синхронными функциями из cruds.py
+import asyncio
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import Corpus, CorpusToken, User, Token
+from app.auth.auth import get_password_hash_async, invalidate_token_async, invalidate_user_async
+from app.cruds.cruds import name_prefix_bounds, store_corpus_text
+from app.services.vocabulary import Vocabulary
+
+
+async def get_user(db: AsyncSession, username: str):
+    return await db.scalar(select(User).where(User.username == username))
+
+async def create_user(db: AsyncSession, username: str, password: str):
+    # Хеш считается в пуле bcrypt, цикл событий в это время свободен.
+    # Соединение на время ожидания возвращается в пул (см. authenticate_user_async)
+    await db.rollback()
+    hashed_password = await get_password_hash_async(password)
+    db_user = User(username=username, hashed_password=hashed_password)
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+async def create_token(db: AsyncSession, token: str, user_id: int, expires_at: datetime):
+    db_token = Token(token=token, user_id=user_id, expires_at=expires_at)
+    db.add(db_token)
+    await db.commit()
+    return db_token
+
+async def get_token(db: AsyncSession, token: str):
+    return await db.scalar(select(Token).where(Token.token == token))
+
+async def revoke_token(db: AsyncSession, token: str):
+    await db.execute(update(Token).where(Token.token == token).values(is_active=False))
+    await db.commit()
+    # Кэши проверенных токенов во всех процессах API должны забыть этот токен
+    await invalidate_token_async(token)
+
+async def set_user_active(db: AsyncSession, user_id: int, is_active: bool):
+    await db.execute(update(User).where(User.id == user_id).values(is_active=is_active))
+    await db.commit()
+    await invalidate_user_async(user_id)
+
+def build_corpus_vocabulary(text: str):
+    # Сжатие, хеш и словарь большого корпуса считаются в потоке, чтобы не держать цикл событий
+    return store_corpus_text(text), Vocabulary.from_text(text)
+
+async def create_corpus(db: AsyncSession, name: str, text: str):
+    content_hash, vocabulary = await asyncio.to_thread(build_corpus_vocabulary, text)
+    db_corpus = Corpus(name=name, content_hash=content_hash)
+    db.add(db_corpus)
+    await db.flush()
+    # Словарь строится один раз при загрузке и сохраняется рядом с корпусом
+    await save_corpus_vocabulary(db, db_corpus.id, vocabulary)
+    await db.commit()
+    return db_corpus
+
+async def save_streamed_corpus(db: AsyncSession, name: str, content_hash: str, vocabulary: Vocabulary):
+    # Корпус, загруженный потоком: текст уже лежит в сжатом хранилище (по хешу)
+    db_corpus = Corpus(name=name, content_hash=content_hash)
+    db.add(db_corpus)
+    await db.flush()
+    await save_corpus_vocabulary(db, db_corpus.id, vocabulary)
+    await db.commit()
+    return db_corpus
+
+async def save_corpus_vocabulary(db: AsyncSession, corpus_id: int, vocabulary: Vocabulary):
+    rows = [
+        {"corpus_id": corpus_id, "token": token, "frequency": frequency, "length": len(token)}
+        for token, frequency in vocabulary.items()
+    ]
+    if rows:
+        await db.execute(insert(CorpusToken), rows)
+
+async def get_corpus(db: AsyncSession, corpus_id: int):
+    return await db.scalar(select(Corpus).where(Corpus.id == corpus_id))
+
+async def get_corpus_by_name(db: AsyncSession, name: str):
+    return await db.scalar(select(Corpus).where(Corpus.name == name))
+
+async def get_corpus_hash(db: AsyncSession, corpus_id: int) -> Optional[str]:
+    # None, если корпуса нет. Хеш есть у всех корпусов: старые получили его в миграциях
+    return await db.scalar(select(Corpus.content_hash).where(Corpus.id == corpus_id))
+
+async def list_corpuses(db: AsyncSession, after_id: Optional[int] = None, limit: int = 100, name_prefix: Optional[str] = None):
+    # Только id и name; постраничный вывод по id (keyset): страница - limit строк с id > after_id
+    query = select(Corpus.id, Corpus.name)
+    if after_id is not None:
+        query = query.where(Corpus.id > after_id)
+    if name_prefix:
+        low, high = name_prefix_bounds(name_prefix)
+        query = query.where(Corpus.name >= low, Corpus.name < high)
+    return (await db.execute(query.order_by(Corpus.id).limit(limit))).all()
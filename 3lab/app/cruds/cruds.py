@@ -1,8 +1,12 @@
 # app/cruds/cruds.py
 from sqlalchemy.orm import Session
-from app.models.models import Corpus, User, Token  # Добавили модель Token
-from app.auth.auth import get_password_hash
+from app.models.models import Corpus, CorpusToken, User, Token  # Добавили модель Token
+from app.auth.auth import get_password_hash, invalidate_token, invalidate_user
+from app.services.vocabulary import Vocabulary, VocabularyBuilder
+from app.services.blob_store import iter_corpus_blob, write_corpus_blob
+from app.core.config import settings
 from datetime import datetime
+from typing import Optional, Tuple
 
 def create_user(db: Session, username: str, password: str):
     hashed_password = get_password_hash(password)
@@ -22,15 +26,100 @@ def create_token(db: Session, token: str, user_id: int, expires_at: datetime):
 def get_token(db: Session, token: str):
     return db.query(Token).filter(Token.token == token).first()
 
+def revoke_token(db: Session, token: str):
+    db.query(Token).filter(Token.token == token).update({Token.is_active: False}, synchronize_session=False)
+    db.commit()
+    # Кэши проверенных токенов во всех процессах API должны забыть этот токен
+    invalidate_token(token)
+
+def set_user_active(db: Session, user_id: int, is_active: bool):
+    db.query(User).filter(User.id == user_id).update({User.is_active: is_active}, synchronize_session=False)
+    db.commit()
+    invalidate_user(user_id)
+
+def store_corpus_text(text: str) -> str:
+    # Текст уходит в сжатое хранилище по хешу; одинаковые тексты хранятся один раз
+    return write_corpus_blob(settings.CORPUS_DIR, text, settings.CORPUS_COMPRESSION)
+
+def read_corpus_vocabulary(content_hash: str) -> Vocabulary:
+    # Словарь по сохранённому тексту: файл распаковывается кусками, текст целиком в памяти не бывает
+    builder = VocabularyBuilder()
+    for chunk in iter_corpus_blob(settings.CORPUS_DIR, content_hash):
+        builder.feed_bytes(chunk)
+    return builder.finish()
+
 def create_corpus(db: Session, name: str, text: str):
-    db_corpus = Corpus(name=name, text=text)
+    db_corpus = Corpus(name=name, content_hash=store_corpus_text(text))
     db.add(db_corpus)
+    db.flush()
+    # Словарь строится один раз при загрузке и сохраняется рядом с корпусом
+    save_corpus_vocabulary(db, db_corpus.id, Vocabulary.from_text(text))
     db.commit()
     db.refresh(db_corpus)
     return db_corpus
 
+def save_corpus_vocabulary(db: Session, corpus_id: int, vocabulary: Vocabulary):
+    db.bulk_insert_mappings(CorpusToken, [
+        {"corpus_id": corpus_id, "token": token, "frequency": frequency, "length": len(token)}
+        for token, frequency in vocabulary.items()
+    ])
+
+def get_corpus_vocabulary(db: Session, corpus_id: int, build_missing: bool = True) -> Optional[Vocabulary]:
+    return get_corpus_vocabulary_and_hash(db, corpus_id, build_missing)[0]
+
+def get_corpus_vocabulary_and_hash(
+    db: Session, corpus_id: int, build_missing: bool = True,
+) -> Tuple[Optional[Vocabulary], Optional[str]]:
+    # Словарь и хеш содержимого, которому он соответствует. Хеш читается тем же запросом,
+    # что и токены: перезагрузка корпуса между двумя запросами дала бы словарь нового текста
+    # с хешем старого. build_missing=False - только чтение: словаря нет -> (None, None)
+    rows = (
+        db.query(CorpusToken.token, CorpusToken.frequency, Corpus.content_hash)
+        .join(Corpus, Corpus.id == CorpusToken.corpus_id)
+        .filter(CorpusToken.corpus_id == corpus_id)
+        .order_by(CorpusToken.id)
+        .all()
+    )
+    if rows:
+        vocabulary = Vocabulary([row.token for row in rows], [row.frequency for row in rows])
+        return vocabulary, rows[0].content_hash
+    if not build_missing:
+        return None, None
+
+    # Корпус загружен до появления словаря: строим по тексту из хранилища и сохраняем.
+    # Это единственное место, где текст корпуса распаковывается
+    corpus = get_corpus(db, corpus_id)
+    if corpus is None:
+        return None, None
+    vocabulary = read_corpus_vocabulary(corpus.content_hash)
+    save_corpus_vocabulary(db, corpus_id, vocabulary)
+    db.commit()
+    return vocabulary, corpus.content_hash
+
 def get_corpus(db: Session, corpus_id: int):
     return db.query(Corpus).filter(Corpus.id == corpus_id).first()
 
+def get_corpus_by_name(db: Session, name: str):
+    return db.query(Corpus).filter(Corpus.name == name).first()
+
+def get_corpus_hash(db: Session, corpus_id: int) -> Optional[str]:
+    # None, если корпуса нет. Хеш есть у всех корпусов: старые получили его в миграциях
+    return db.query(Corpus.content_hash).filter(Corpus.id == corpus_id).scalar()
+
 def get_all_corpuses(db: Session):
-    return db.query(Corpus).all()
\ No newline at end of file
+    return db.query(Corpus).all()
+
+def name_prefix_bounds(prefix: str):
+    # Префикс как диапазон [prefix, prefix + максимальный символ): в отличие от LIKE
+    # (в SQLite без учёта регистра) такое условие идёт по индексу на name
+    return prefix, prefix + "\U0010ffff"
+
+def list_corpuses(db: Session, after_id: Optional[int] = None, limit: int = 100, name_prefix: Optional[str] = None):
+    # Только id и name; постраничный вывод по id (keyset): страница - limit строк с id > after_id
+    query = db.query(Corpus.id, Corpus.name)
+    if after_id is not None:
+        query = query.filter(Corpus.id > after_id)
+    if name_prefix:
+        low, high = name_prefix_bounds(name_prefix)
+        query = query.filter(Corpus.name >= low, Corpus.name < high)
+    return query.order_by(Corpus.id).limit(limit).all()
\ No newline at end of file
@@ -1,10 +1,97 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from app.core.config import settings
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./corpus.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
+
+# Асинхронные драйверы для тех же баз: ими пользуется слой API
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def async_database_url(url: str) -> str:
+    # sqlite:///./corpus.db -> sqlite+aiosqlite:///./corpus.db, postgresql://... -> postgresql+asyncpg://...
+    # Если драйвер в URL указан явно, он и используется
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.drivername)
+    if driver is None:
+        return url
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def is_sqlite_file(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database not in (None, "", ":memory:")
+
+
+def read_only_database_url(url: str) -> str:
+    # Для файла SQLite - тот же файл, открытый в режиме только чтения (URI mode=ro);
+    # для остальных баз - тот же URL (реплику можно задать через DATABASE_READ_URL)
+    if not is_sqlite_file(url):
+        return url
+    parsed = make_url(url)
+    if parsed.database.startswith("file:"):
+        return url
+    return parsed.set(database=f"file:{parsed.database}", query={"mode": "ro", "uri": "true"}).render_as_string(
+        hide_password=False,
+    )
+
+
+def pool_options(url: str) -> dict:
+    # Размер пула из настроек; для SQLite в памяти SQLAlchemy выбирает свой пул без этих параметров
+    if make_url(url).get_backend_name() == "sqlite" and not is_sqlite_file(url):
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+    }
+
+
+def set_sqlite_pragmas(dbapi_connection, read_only: bool = False):
+    # Профиль SQLite для одновременной работы API и воркеров:
+    # WAL - читатели не ждут писателя, synchronous=NORMAL - без fsync на каждый коммит (в WAL это безопасно),
+    # busy_timeout - ждать блокировку вместо немедленного "database is locked",
+    # mmap и кэш страниц - меньше системных вызовов при чтении словарей
+    cursor = dbapi_connection.cursor()
+    if read_only:
+        # Режим журнала задаёт пишущее соединение; здесь только запрет записи
+        cursor.execute("PRAGMA query_only=ON")
+    elif settings.SQLITE_WAL:
+        cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.execute(f"PRAGMA cache_size={int(settings.SQLITE_CACHE_SIZE)}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def tune_sqlite(engine: Engine, read_only: bool = False) -> Engine:
+    if engine.dialect.name == "sqlite":
+        @event.listens_for(engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            set_sqlite_pragmas(dbapi_connection, read_only)
+    return engine
+
+
+engine = tune_sqlite(create_engine(SQLALCHEMY_DATABASE_URL, **pool_options(SQLALCHEMY_DATABASE_URL)))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Только чтение для поисковых воркеров: словари корпусов читаются без блокировок записи
+# и без риска случайно что-то изменить
+READ_DATABASE_URL = settings.DATABASE_READ_URL or read_only_database_url(SQLALCHEMY_DATABASE_URL)
+read_engine = tune_sqlite(create_engine(READ_DATABASE_URL, **pool_options(READ_DATABASE_URL)), read_only=True)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# API работает через async engine (не занимает пул потоков на время запроса к БД),
+# воркеры Celery и миграции - через синхронный engine выше
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or async_database_url(SQLALCHEMY_DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_options(ASYNC_DATABASE_URL))
+tune_sqlite(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 
 def get_db():
     db = SessionLocal()
@@ -12,3 +99,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
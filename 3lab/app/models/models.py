@@ -1,5 +1,5 @@
 # app/models/models.py
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -15,7 +15,21 @@ class Corpus(Base):
     __tablename__ = "corpuses"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    text = Column(String)
+    # Текст хранится сжатым в CORPUS_DIR под именем content_hash (см. blob_store.py)
+    content_hash = Column(String(64), index=True)  # sha256 текста: ключ файла, кэшей и индексов
+
+class CorpusToken(Base):
+    # Словарь корпуса: уникальные токены, их частоты и длины (корзины для отсечения по длине)
+    __tablename__ = "corpus_tokens"
+    id = Column(Integer, primary_key=True, index=True)
+    corpus_id = Column(Integer, ForeignKey("corpuses.id"), nullable=False, index=True)
+    token = Column(String, nullable=False)
+    frequency = Column(Integer, nullable=False)
+    length = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_corpus_tokens_corpus_id_length", "corpus_id", "length"),
+    )
 
 class Token(Base):
     __tablename__ = "tokens"
@@ -1,6 +1,7 @@
 # app/schemas/schemas.py
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Literal, Optional, List
+from app.core.config import settings
 
 
 # Схемы для пользователей
@@ -52,18 +53,77 @@ class CorpusItem(BaseModel):
     name: str
 
 
+class CorpusListResponse(BaseModel):
+    corpuses: List[CorpusItem]
+    next_after_id: Optional[int] = None  # after_id для следующей страницы; None - страниц больше нет
+
+
+# Движки расстояний, см. services.ENGINES
+Engine = Literal["python", "bitparallel", "numpy"]
+
+
 class SearchRequest(BaseModel):
     word: str
     algorithm: str
     corpus_id: int
+    engine: Engine = "python"  # "bitparallel" и "numpy" ускоряют только levenshtein
+    max_distance: Optional[int] = Field(None, ge=0)  # Слова дальше порога отбрасываются
+    top_k: int = Field(10, ge=1)  # Сколько лучших совпадений вернуть
+    shards: int = Field(1, ge=1, le=settings.MAX_SHARDS)  # На сколько параллельных подзадач разбить словарь
+    stream: bool = False  # Присылать промежуточные топы (PARTIAL) по ходу поиска
+
+
+# Пакетный поиск: слова списком (words) и/или текстом (text, делится по пробелам, как корпус).
+# Повторы ищутся один раз, порядок слов сохраняется
+class BatchSearchRequest(BaseModel):
+    words: List[str] = []
+    text: Optional[str] = None
+    algorithm: str
+    corpus_id: int
+    engine: Engine = "python"
+    max_distance: Optional[int] = Field(None, ge=0)
+    top_k: int = Field(10, ge=1)  # Сколько лучших совпадений вернуть для каждого слова
+
+    def query_words(self) -> List[str]:
+        words = [word for word in self.words if word]
+        if self.text:
+            words.extend(self.text.split())
+        return list(dict.fromkeys(words))
 
 
 class SearchResultItem(BaseModel):
     word: str
     distance: int
+    count: int = 1  # Сколько раз слово встречается в корпусе
 
 
 class SearchResponse(BaseModel):
     execution_time: float
     results: List[SearchResultItem]
-    
\ No newline at end of file
+    seq: int = 0  # Номер сообщения задачи: больший номер - более свежий топ
+
+
+# Сообщение о результатах поиска в WebSocket.
+# PARTIAL - промежуточный топ (по просмотренной части словаря или по одному шарду),
+# COMPLETED - окончательный; внутри задачи seq растёт, топы с меньшим seq устарели
+class SearchResultMessage(BaseModel):
+    status: str  # "PARTIAL" или "COMPLETED"
+    task_id: Optional[str] = None
+    seq: int = 0
+    shard: Optional[int] = None  # Шард, чей топ пришёл (только PARTIAL при shards > 1)
+    results: List[SearchResultItem]
+
+
+class WordSearchResult(BaseModel):
+    query: str  # Слово из запроса
+    results: List[SearchResultItem]
+
+
+# Итог пакетного поиска в WebSocket (status COMPLETED, batch=True): топ для каждого слова
+class BatchSearchResultMessage(BaseModel):
+    status: str
+    task_id: Optional[str] = None
+    batch: bool = True
+    seq: int = 0
+    cached_words: int = 0  # Сколько слов взято из кэша результатов
+    results: List[WordSearchResult]
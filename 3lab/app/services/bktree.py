@@ -0,0 +1,100 @@
+# app/services/bktree.py
+import os
+from typing import Dict, List, Optional, Tuple
+from app.services.services import bitparallel_levenshtein_distance, build_pattern_masks
+from app.services.vocabulary import Vocabulary
+from app.services.index_files import load_json, save_json_atomic
+
+
+# BK-дерево над словарём корпуса по расстоянию Левенштейна.
+# Узел хранит индекс токена в словаре и детей по расстоянию до них.
+# Для Дамерау-Левенштейна (OSA) используется то же дерево: OSA не метрика
+# (нарушает неравенство треугольника), но Левенштейн <= 2 * OSA,
+# поэтому запрос с радиусом 2k и последующей проверкой OSA даёт точный ответ
+class BKTree:
+    def __init__(self, tokens: List[str], indices: List[int], children: List[Dict[int, int]]):
+        self.tokens = tokens
+        self.indices = indices
+        self.children = children
+
+    @classmethod
+    def build(cls, vocabulary: Vocabulary) -> "BKTree":
+        tree = cls(vocabulary.tokens, [], [])
+        masks = []
+        for index, token in enumerate(vocabulary.tokens):
+            if not tree.indices:
+                tree._add_node(index, masks)
+                continue
+            node = 0
+            while True:
+                node_token = tree.tokens[tree.indices[node]]
+                distance = bitparallel_levenshtein_distance(masks[node], len(node_token), token)
+                child = tree.children[node].get(distance)
+                if child is None:
+                    tree.children[node][distance] = len(tree.indices)
+                    tree._add_node(index, masks)
+                    break
+                node = child
+        return tree
+
+    def _add_node(self, index: int, masks: List[Dict[str, int]]):
+        self.indices.append(index)
+        self.children.append({})
+        masks.append(build_pattern_masks(self.tokens[index]))
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def search(self, word: str, max_distance: int) -> Tuple[List[Tuple[int, int]], int]:
+        # Возвращает пары (расстояние, индекс токена) в радиусе max_distance
+        # и число посещённых узлов (для сравнения с полным перебором)
+        if not self.indices:
+            return [], 0
+
+        masks = build_pattern_masks(word)
+        word_length = len(word)
+        matches = []
+        visited = 0
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            visited += 1
+            index = self.indices[node]
+            distance = bitparallel_levenshtein_distance(masks, word_length, self.tokens[index])
+            if distance <= max_distance:
+                matches.append((distance, index))
+            # Неравенство треугольника: поддеревья вне [d - k, d + k] пропускаем
+            for child_distance, child in self.children[node].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return matches, visited
+
+    def save(self, path: str):
+        save_json_atomic(path, {
+            "size": len(self.tokens),
+            "indices": self.indices,
+            "children": [list(children.items()) for children in self.children],
+        })
+
+    @classmethod
+    def load(cls, path: str, vocabulary: Vocabulary) -> Optional["BKTree"]:
+        # None, если файла нет, он не читается или построен для другого словаря
+        data = load_json(path)
+        if data is None or data.get("size") != len(vocabulary):
+            return None
+        children = [{distance: child for distance, child in items} for items in data["children"]]
+        return cls(vocabulary.tokens, data["indices"], children)
+
+
+def load_or_build_bktree(index_dir: str, key: str, vocabulary: Vocabulary) -> BKTree:
+    # Дерево строится лениво при первом поиске и кэшируется на диске.
+    # key - хеш содержимого корпуса, поэтому одинаковые корпуса делят одно дерево
+    path = os.path.join(index_dir, f"bktree_{key}.json")
+    if os.path.exists(path):
+        tree = BKTree.load(path, vocabulary)
+        if tree is not None:
+            return tree
+
+    tree = BKTree.build(vocabulary)
+    tree.save(path)
+    return tree
@@ -0,0 +1,167 @@
+# app/services/blob_store.py
+import gzip
+import hashlib
+import io
+import os
+import tempfile
+from typing import Iterator, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # zstandard не обязателен: без него тексты сжимаются zlib (формат gzip)
+    zstandard = None
+
+COMPRESSIONS = ("zstd", "zlib")
+# Чем сжат файл, видно по расширению; .txt - несжатые файлы, записанные до появления сжатия
+BLOB_EXTENSIONS = {"zstd": ".zst", "zlib": ".gz", None: ".txt"}
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 6
+READ_CHUNK_SIZE = 1 << 20
+
+
+def resolve_compression(compression: str) -> str:
+    # zstd запрошен, но не установлен - используем zlib
+    if compression == "zstd" and zstandard is not None:
+        return "zstd"
+    return "zlib"
+
+
+def corpus_blob_path(corpus_dir: str, content_hash: str, compression: Optional[str]) -> str:
+    # Файлы адресуются хешем содержимого: одинаковые корпуса хранятся один раз
+    return os.path.join(corpus_dir, f"{content_hash}{BLOB_EXTENSIONS[compression]}")
+
+
+def find_corpus_blob(corpus_dir: str, content_hash: str) -> Optional[Tuple[str, Optional[str]]]:
+    # (путь, сжатие) существующего файла с этим содержимым или None
+    for compression in ("zstd", "zlib", None):
+        path = corpus_blob_path(corpus_dir, content_hash, compression)
+        if os.path.exists(path):
+            return path, compression
+    return None
+
+
+def open_corpus_blob(corpus_dir: str, content_hash: str):
+    # Двоичный поток с уже распакованным текстом; распаковка идёт по мере чтения
+    found = find_corpus_blob(corpus_dir, content_hash)
+    if found is None:
+        return None
+    path, compression = found
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError(f"Corpus blob {path} is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    if compression == "zlib":
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def iter_corpus_blob(corpus_dir: str, content_hash: str, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[bytes]:
+    # Текст корпуса кусками (байты UTF-8); нет файла - ничего
+    reader = open_corpus_blob(corpus_dir, content_hash)
+    if reader is None:
+        return
+    with reader:
+        while True:
+            chunk = reader.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def read_corpus_blob(corpus_dir: str, content_hash: str) -> Optional[str]:
+    reader = open_corpus_blob(corpus_dir, content_hash)
+    if reader is None:
+        return None
+    with io.TextIOWrapper(reader, encoding="utf-8") as f:
+        return f.read()
+
+
+# Запись текста корпуса в файл по частям: текст целиком в памяти не собирается.
+# Пишется со сжатием во временный файл рядом с хранилищем, sha256 считается по несжатым
+# байтам UTF-8 (content_hash корпуса), в конце файл переименовывается
+# в путь по хешу. Если такое содержимое уже хранится, новый файл просто удаляется
+class CorpusBlobWriter:
+    def __init__(self, corpus_dir: str, compression: str = "zstd"):
+        self.corpus_dir = corpus_dir
+        self.compression = resolve_compression(compression)
+        os.makedirs(corpus_dir, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=corpus_dir, suffix=".part")
+        self.file = os.fdopen(fd, "wb")
+        if self.compression == "zstd":
+            self.stream = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(self.file, closefd=False)
+        else:
+            # mtime=0: одинаковый текст даёт одинаковый файл
+            self.stream = gzip.GzipFile(fileobj=self.file, mode="wb", compresslevel=ZLIB_LEVEL, mtime=0)
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes):
+        self.stream.write(chunk)
+        self.sha256.update(chunk)
+        self.size += len(chunk)
+
+    def finish(self) -> str:
+        # Возвращает хеш содержимого; файл уже лежит по corpus_blob_path
+        self.stream.close()
+        self.file.close()
+        content_hash = self.sha256.hexdigest()
+        found = find_corpus_blob(self.corpus_dir, content_hash)
+        if found is not None and found[1] is not None:
+            # Сжатая копия уже есть; несжатый .txt не в счёт - его заменяет этот файл
+            os.remove(self.tmp_path)
+            return content_hash
+        os.chmod(self.tmp_path, 0o644)  # mkstemp создаёт файл 0600, а читать его будут и воркеры
+        os.replace(self.tmp_path, corpus_blob_path(self.corpus_dir, content_hash, self.compression))
+        if found is not None:
+            # Несжатый файл удаляется только теперь, когда сжатая копия уже на месте
+            try:
+                os.remove(found[0])
+            except FileNotFoundError:  # Его уже заменила параллельная запись
+                pass
+        return content_hash
+
+    def abort(self):
+        self.stream.close()
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def write_corpus_blob(corpus_dir: str, text: str, compression: str = "zstd") -> str:
+    # Сохраняет текст целиком (обычная загрузка) и возвращает хеш содержимого.
+    # Повторная загрузка того же текста не сжимается и не пишется заново
+    data = text.encode("utf-8")
+    content_hash = hashlib.sha256(data).hexdigest()
+    found = find_corpus_blob(corpus_dir, content_hash)
+    if found is not None and found[1] is not None:
+        return content_hash
+    writer = CorpusBlobWriter(corpus_dir, compression)
+    view = memoryview(data)
+    try:
+        for start in range(0, len(data), READ_CHUNK_SIZE):
+            writer.write(view[start:start + READ_CHUNK_SIZE])
+    except BaseException:
+        writer.abort()
+        raise
+    # Если был только несжатый файл, finish заменит его сжатым
+    return writer.finish()
+
+
+def compress_corpus_blob(corpus_dir: str, content_hash: str, compression: str = "zstd") -> bool:
+    # Пережимает несжатый .txt-файл; False, если такого файла нет
+    found = find_corpus_blob(corpus_dir, content_hash)
+    if found is None or found[1] is not None:
+        return False
+    writer = CorpusBlobWriter(corpus_dir, compression)
+    try:
+        with open(found[0], "rb") as f:
+            while True:
+                chunk = f.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.finish()  # Удаляет .txt после того, как сжатый файл на месте
+    return True
@@ -0,0 +1,47 @@
+# app/services/cache.py
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+# Простой LRU-кэш в памяти процесса: при переполнении вытесняется
+# запись, к которой дольше всего не обращались. Если задан ttl (в секундах),
+# записи старше ttl считаются отсутствующими
+class LRUCache:
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.expires_at = {}
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        if key not in self.data:
+            return default
+        if self.ttl is not None and self.expires_at[key] < time.monotonic():
+            self.pop(key)
+            return default
+        self.data.move_to_end(key)
+        return self.data[key]
+
+    def set(self, key: Hashable, value: Any):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        if self.ttl is not None:
+            self.expires_at[key] = time.monotonic() + self.ttl
+        while len(self.data) > self.maxsize:
+            oldest, _ = self.data.popitem(last=False)
+            self.expires_at.pop(oldest, None)
+
+    def pop(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        self.expires_at.pop(key, None)
+        return self.data.pop(key, default)
+
+    def clear(self):
+        self.data.clear()
+        self.expires_at.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, self) is not self
+
+    def __len__(self) -> int:
+        return len(self.data)
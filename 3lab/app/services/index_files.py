@@ -0,0 +1,32 @@
+# app/services/index_files.py
+import json
+import os
+import tempfile
+from typing import Optional
+
+
+def save_json_atomic(path: str, data: dict):
+    # Уникальный временный файл рядом и переименование: параллельные записи одного индекса
+    # не мешают друг другу, а читатель видит либо старый файл, либо новый целиком
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.chmod(tmp_path, 0o644)  # mkstemp создаёт файл 0600, а читать его будут все воркеры
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_json(path: str) -> Optional[dict]:
+    # Испорченный или недописанный файл считается отсутствующим: индекс построится заново
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
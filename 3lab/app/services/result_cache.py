@@ -0,0 +1,59 @@
+# app/services/result_cache.py
+import hashlib
+import json
+from typing import Optional
+from app.services.cache import LRUCache
+
+
+def search_cache_key(
+    corpus_id: int,
+    content_hash: str,
+    word: str,
+    algorithm: str,
+    max_distance: Optional[int],
+    top_k: Optional[int],
+) -> str:
+    # Движок и число шардов на результат не влияют, поэтому в ключ не входят
+    params = json.dumps([word, algorithm, max_distance, top_k], ensure_ascii=False)
+    digest = hashlib.sha1(params.encode("utf-8")).hexdigest()
+    return f"search_cache:{corpus_id}:{content_hash}:{digest}"
+
+
+# Кэш результатов поиска: локальный LRU-уровень в памяти процесса и общий уровень в Redis.
+# В ключ входит хеш содержимого корпуса, поэтому после перезагрузки корпуса старые записи
+# больше не находятся; invalidate_corpus дополнительно удаляет их из Redis
+class SearchResultCache:
+    def __init__(self, redis_client, ttl: int, local_size: int):
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.local = LRUCache(local_size, ttl)
+
+    def get(self, key: str) -> Optional[dict]:
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        raw = self.redis_client.get(key)
+        if raw is None:
+            return None
+        value = json.loads(raw)
+        self.local.set(key, value)
+        return value
+
+    def set(self, key: str, corpus_id: int, value: dict):
+        self.local.set(key, value)
+        keys_set = f"search_cache_keys:{corpus_id}"
+        pipe = self.redis_client.pipeline()
+        pipe.set(key, json.dumps(value), ex=self.ttl)
+        pipe.sadd(keys_set, key)
+        pipe.expire(keys_set, self.ttl)
+        pipe.execute()
+
+    def invalidate_corpus(self, corpus_id: int):
+        keys_set = f"search_cache_keys:{corpus_id}"
+        keys = self.redis_client.smembers(keys_set)
+        if keys:
+            self.redis_client.delete(*keys)
+        self.redis_client.delete(keys_set)
+        prefix = f"search_cache:{corpus_id}:"
+        for key in [key for key in self.local.data if key.startswith(prefix)]:
+            self.local.pop(key)
@@ -1,5 +1,13 @@
+import heapq
+import itertools
 import time
-from typing import List, Tuple
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple, Union
+from app.services.vocabulary import Vocabulary
+from app.services.vectorized import numpy_available, numpy_levenshtein_distances
+
+if TYPE_CHECKING:
+    from app.services.bktree import BKTree
+    from app.services.symspell import SymSpellIndex
 
 
 def levenshtein_distance(s1: str, s2: str) -> int:
@@ -22,50 +30,504 @@ def levenshtein_distance(s1: str, s2: str) -> int:
     return previous_row[-1]
 
 
+def build_pattern_masks(pattern: str) -> Dict[str, int]:
+    # Битовые маски вхождений символов запроса (Peq): считаются один раз на поиск
+    masks: Dict[str, int] = {}
+    for i, c in enumerate(pattern):
+        masks[c] = masks.get(c, 0) | (1 << i)
+    return masks
+
+
+def bitparallel_levenshtein_distance(masks: Dict[str, int], pattern_length: int, text: str) -> int:
+    # Алгоритм Майерса в варианте Хирё для глобального расстояния:
+    # столбец матрицы ДП хранится как пара битовых векторов Pv/Mv (+1/-1 по вертикали),
+    # за один символ text пересчитывается весь столбец
+    if pattern_length == 0:
+        return len(text)
+
+    full_mask = (1 << pattern_length) - 1
+    last_bit = 1 << (pattern_length - 1)
+    pv = full_mask
+    mv = 0
+    score = pattern_length
+
+    for c in text:
+        eq = masks.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = (mv | ~(xh | pv)) & full_mask
+        mh = pv & xh
+        if ph & last_bit:
+            score += 1
+        elif mh & last_bit:
+            score -= 1
+        ph = ((ph << 1) | 1) & full_mask
+        mh = (mh << 1) & full_mask
+        pv = (mh | ~(xv | ph)) & full_mask
+        mv = ph & xv
+
+    return score
+
+
 def damerau_levenshtein_distance(s1: str, s2: str) -> int:
+    # Оптимальное выравнивание строк (OSA) на трёх скользящих строках матрицы
+    # вместо словаря с ключами (i, j)
     if len(s1) < len(s2):
         return damerau_levenshtein_distance(s2, s1)
     
     if len(s2) == 0:
         return len(s1)
     
-    d = {}
+    len2 = len(s2)
+    before_previous_row = None
+    previous_row = list(range(len2 + 1))
+    
+    for i, c1 in enumerate(s1):
+        current_row = [i + 1] + [0] * len2
+        for j, c2 in enumerate(s2):
+            if c1 == c2:
+                cost = previous_row[j]
+            else:
+                cost = min(
+                    previous_row[j + 1] + 1,  # deletion
+                    current_row[j] + 1,       # insertion
+                    previous_row[j] + 1       # substitution
+                )
+            if i > 0 and j > 0 and c1 == s2[j - 1] and s1[i - 1] == c2:
+                cost = min(cost, before_previous_row[j - 1] + 1)  # transposition
+            current_row[j + 1] = cost
+        before_previous_row, previous_row = previous_row, current_row
+    
+    return previous_row[-1]
+
+
+def levenshtein_distance_bounded(s1: str, s2: str, max_distance: int) -> int:
+    # Ленточная ДП Укконена: считаем только клетки |i - j| <= max_distance
+    # и бросаем вычисление, как только минимум строки превысил порог.
+    # Если расстояние больше порога, возвращается max_distance + 1
+    if len(s1) < len(s2):
+        return levenshtein_distance_bounded(s2, s1, max_distance)
+    
     len1, len2 = len(s1), len(s2)
+    limit = max_distance + 1
+    if len1 - len2 > max_distance:
+        return limit
+    if len2 == 0:
+        return len1
+    
+    previous_row = [min(j, limit) for j in range(len2 + 1)]
+    for i in range(1, len1 + 1):
+        c1 = s1[i - 1]
+        current_row = [limit] * (len2 + 1)
+        current_row[0] = min(i, limit)
+        row_min = current_row[0]
+        for j in range(max(1, i - max_distance), min(len2, i + max_distance) + 1):
+            cost = min(
+                previous_row[j] + 1,                       # deletion
+                current_row[j - 1] + 1,                    # insertion
+                previous_row[j - 1] + (c1 != s2[j - 1])    # substitution
+            )
+            if cost > limit:
+                cost = limit
+            current_row[j] = cost
+            if cost < row_min:
+                row_min = cost
+        if row_min > max_distance:
+            return limit
+        previous_row = current_row
     
-    for i in range(-1, len1 + 1):
-        d[(i, -1)] = i + 1
-    for j in range(-1, len2 + 1):
-        d[(-1, j)] = j + 1
+    return previous_row[-1]
+
+
+def damerau_levenshtein_distance_bounded(s1: str, s2: str, max_distance: int) -> int:
+    # То же, что levenshtein_distance_bounded, но с транспозициями (OSA)
+    if len(s1) < len(s2):
+        return damerau_levenshtein_distance_bounded(s2, s1, max_distance)
+    
+    len1, len2 = len(s1), len(s2)
+    limit = max_distance + 1
+    if len1 - len2 > max_distance:
+        return limit
+    if len2 == 0:
+        return len1
     
-    for i in range(len1):
-        for j in range(len2):
-            if s1[i] == s2[j]:
-                d[(i, j)] = d[(i-1, j-1)]
+    before_previous_row = None
+    previous_row = [min(j, limit) for j in range(len2 + 1)]
+    for i in range(1, len1 + 1):
+        c1 = s1[i - 1]
+        current_row = [limit] * (len2 + 1)
+        current_row[0] = min(i, limit)
+        row_min = current_row[0]
+        for j in range(max(1, i - max_distance), min(len2, i + max_distance) + 1):
+            c2 = s2[j - 1]
+            if c1 == c2:
+                cost = previous_row[j - 1]
             else:
-                d[(i, j)] = min(
-                    d[(i-1, j)] + 1,    # deletion
-                    d[(i, j-1)] + 1,    # insertion
-                    d[(i-1, j-1)] + 1   # substitution
+                cost = min(
+                    previous_row[j] + 1,      # deletion
+                    current_row[j - 1] + 1,   # insertion
+                    previous_row[j - 1] + 1   # substitution
                 )
-            if (i > 0 and j > 0 and s1[i] == s2[j-1] and s1[i-1] == s2[j]):
-                d[(i, j)] = min(d[(i, j)], d[(i-2, j-2)] + 1)  # transposition
+            if i > 1 and j > 1 and c1 == s2[j - 2] and s1[i - 2] == c2:
+                cost = min(cost, before_previous_row[j - 2] + 1)  # transposition
+            if cost > limit:
+                cost = limit
+            current_row[j] = cost
+            if cost < row_min:
+                row_min = cost
+        if row_min > max_distance:
+            return limit
+        before_previous_row, previous_row = previous_row, current_row
     
-    return d[(len1-1, len2-1)]
+    return previous_row[-1]
 
 
-def fuzzy_search(word: str, corpus_text: str, algorithm: str) -> List[Tuple[str, int]]:
-    words = corpus_text.split()
-    results = []
-    
+ENGINES = ("python", "bitparallel", "numpy")
+
+
+def get_distance_func(word: str, algorithm: str, engine: str = "python") -> Callable[[str, str], int]:
+    if engine not in ENGINES:
+        raise ValueError("Unsupported engine")
+
+    if algorithm == "levenshtein":
+        if engine == "bitparallel":
+            masks = build_pattern_masks(word)
+            pattern_length = len(word)
+            return lambda _, corpus_word: bitparallel_levenshtein_distance(masks, pattern_length, corpus_word)
+        return levenshtein_distance
+    elif algorithm == "damerau-levenshtein":
+        # Битово-параллельного варианта для транспозиций нет, считаем обычной ДП
+        return damerau_levenshtein_distance
+    else:
+        raise ValueError("Unsupported algorithm")
+
+
+def get_bounded_distance_func(word: str, algorithm: str, engine: str = "python") -> Callable[[str, str, int], int]:
+    # Функция (s1, s2, max_distance): результат больше max_distance означает "не подходит"
+    if engine not in ENGINES:
+        raise ValueError("Unsupported engine")
+
     if algorithm == "levenshtein":
-        distance_func = levenshtein_distance
+        if engine == "bitparallel":
+            # Битовый столбец и так дешёвый, порог проверяется уже по готовому расстоянию
+            distance_func = get_distance_func(word, algorithm, engine)
+            return lambda s1, s2, _: distance_func(s1, s2)
+        return levenshtein_distance_bounded
     elif algorithm == "damerau-levenshtein":
-        distance_func = damerau_levenshtein_distance
+        return damerau_levenshtein_distance_bounded
     else:
         raise ValueError("Unsupported algorithm")
+
+
+# progress(processed, total): сколько токенов словаря уже обработано из общего числа
+ProgressCallback = Callable[[int, int], None]
+PROGRESS_STEP = 256  # Как часто (в токенах) перебор сообщает о прогрессе
+# partial(results): текущий лучший топ в том же формате, что и итоговый результат fuzzy_search
+PartialCallback = Callable[[List[Tuple[str, int, int]]], None]
+
+
+def symspell_answers(symspell: Optional["SymSpellIndex"], max_distance: Optional[int]) -> bool:
+    # Индекс SymSpell точен только до своего порога. Без порога ответ индекса
+    # зависел бы от того, успел ли он построиться, поэтому такой запрос идёт перебором
+    return symspell is not None and max_distance is not None and max_distance <= symspell.max_distance
+
+
+def fuzzy_search(
+    word: str,
+    corpus: Union[str, Vocabulary],
+    algorithm: str,
+    engine: str = "python",
+    max_distance: Optional[int] = None,
+    top_k: Optional[int] = None,
+    bktree: Optional["BKTree"] = None,
+    stats: Optional[dict] = None,
+    symspell: Optional["SymSpellIndex"] = None,
+    progress: Optional[ProgressCallback] = None,
+    partial: Optional[PartialCallback] = None,
+) -> List[Tuple[str, int, int]]:
+    # Возвращает тройки (токен, расстояние, сколько раз токен встречается в корпусе).
+    # Каждый уникальный токен считается один раз, частоты подставляются только в результат.
+    # В stats (если передан) записывается число проверенных токенов,
+    # progress(обработано, всего) вызывается по ходу перебора словаря,
+    # partial(топ) - на тех же шагах, если топ изменился (только перебор с top_k:
+    # индексы и NumPy-ядро отвечают целиком быстрее, чем имело бы смысл слать промежуточные топы)
+    vocabulary = Vocabulary.from_text(corpus) if isinstance(corpus, str) else corpus
+    tokens = vocabulary.tokens
+    frequencies = vocabulary.frequencies
     
-    for corpus_word in words:
-        distance = distance_func(word, corpus_word)
-        results.append((corpus_word, distance))
+    if algorithm == "symspell":
+        # Левенштейн по индексу симметричного удаления; без индекса, без порога
+        # или с порогом больше, чем у индекса - обычный перебор
+        if symspell_answers(symspell, max_distance):
+            matches, visited = symspell.search(word, max_distance)
+            return _collect_matches(vocabulary, matches, visited, top_k, stats)
+        algorithm = "levenshtein"
     
-    return sorted(results, key=lambda x: x[1])
+    if bktree is not None and max_distance is not None:
+        return _bktree_search(word, vocabulary, algorithm, bktree, max_distance, top_k, stats)
+    
+    if engine == "numpy":
+        if algorithm == "levenshtein" and numpy_available():
+            matches, visited = numpy_levenshtein_distances(word, vocabulary, max_distance, progress)
+            return _collect_matches(vocabulary, matches, visited, top_k, stats)
+        # Без NumPy (или для других алгоритмов) - обычный путь на чистом Python
+        engine = "python"
+    
+    if max_distance is None and top_k is None:
+        distance_func = get_distance_func(word, algorithm, engine)
+        distances = []
+        for index, token in enumerate(tokens):
+            distances.append(distance_func(word, token))
+            if progress is not None and (index + 1) % PROGRESS_STEP == 0:
+                progress(index + 1, len(tokens))
+        if progress is not None:
+            progress(len(tokens), len(tokens))
+        order = sorted(range(len(tokens)), key=lambda index: distances[index])
+        if stats is not None:
+            stats["visited"] = len(tokens)
+        return [(tokens[index], distances[index], frequencies[index]) for index in order]
+    if top_k is not None and top_k <= 0:
+        return []
+    
+    distance_func = get_bounded_distance_func(word, algorithm, engine)
+    word_length = len(word)
+    bound = max_distance
+    visited = 0
+    processed = 0
+    matches = []
+    # Куча из худших элементов текущего топа: (-distance, -index).
+    # Индекс нужен, чтобы при равных расстояниях порядок совпадал со стабильной сортировкой
+    heap = []
+    changed = False
+    
+    for index in vocabulary.candidate_indices(word_length, max_distance):
+        processed += 1
+        if processed % PROGRESS_STEP == 0:
+            if partial is not None and changed:
+                partial([(tokens[-i], -d, frequencies[-i]) for d, i in sorted(heap, reverse=True)])
+                changed = False
+            if progress is not None:
+                progress(processed, len(tokens))
+        token = tokens[index]
+        if bound is not None:
+            if abs(len(token) - word_length) > bound:
+                continue
+            visited += 1
+            distance = distance_func(word, token, bound)
+            if distance > bound:
+                continue
+        else:
+            visited += 1
+            distance = distance_func(word, token, len(token) + word_length)
+        
+        if top_k is None:
+            matches.append((distance, index))
+            continue
+        
+        if len(heap) < top_k:
+            heapq.heappush(heap, (-distance, -index))
+        elif (distance, index) < (-heap[0][0], -heap[0][1]):
+            heapq.heapreplace(heap, (-distance, -index))
+        else:
+            continue
+        changed = True
+        if len(heap) == top_k:
+            # Топ заполнен: дальше интересны только слова не хуже худшего в куче
+            worst = -heap[0][0]
+            bound = worst if max_distance is None else min(max_distance, worst)
+    
+    if top_k is not None:
+        matches = [(-distance, -index) for distance, index in heap]
+    if stats is not None:
+        stats["visited"] = visited
+    if progress is not None:
+        # Корзины, отсечённые по длине, тоже считаются обработанными
+        progress(len(tokens), len(tokens))
+    matches.sort()
+    return [(tokens[index], distance, frequencies[index]) for distance, index in matches]
+
+
+def fuzzy_search_batch(
+    words: List[str],
+    corpus: Union[str, Vocabulary],
+    algorithm: str,
+    engine: str = "python",
+    max_distance: Optional[int] = None,
+    top_k: Optional[int] = None,
+    bktree: Optional["BKTree"] = None,
+    stats: Optional[dict] = None,
+    symspell: Optional["SymSpellIndex"] = None,
+    progress: Optional[ProgressCallback] = None,
+) -> List[List[Tuple[str, int, int]]]:
+    # Поиск сразу нескольких слов: для каждого слова из words - то же, что вернул бы fuzzy_search.
+    # Перебор идёт одним проходом по словарю: каждый токен достаётся один раз и сравнивается
+    # со всеми словами запроса, которым его длина ещё подходит (у каждого слова свой порог и свой топ).
+    # Индексы (BK-дерево, SymSpell) и NumPy-ядро общие для всех слов, но спрашиваются по слову.
+    # progress(обработано, всего) - по всему пакету; повторяющиеся слова считаются один раз
+    vocabulary = Vocabulary.from_text(corpus) if isinstance(corpus, str) else corpus
+    tokens = vocabulary.tokens
+    frequencies = vocabulary.frequencies
+    queries = list(dict.fromkeys(words))
+
+    if algorithm == "symspell":
+        if not symspell_answers(symspell, max_distance):
+            algorithm, symspell = "levenshtein", None
+    if (
+        symspell is not None
+        or (bktree is not None and max_distance is not None)
+        or (engine == "numpy" and algorithm == "levenshtein" and numpy_available())
+    ):
+        return _batch_per_word(words, queries, vocabulary, algorithm, engine, max_distance, top_k, bktree, stats, symspell, progress)
+    if engine == "numpy":
+        engine = "python"
+
+    if not queries or (top_k is not None and top_k <= 0):
+        if stats is not None:
+            stats["visited"] = 0
+        return [[] for _ in words]
+
+    distance_funcs = [get_bounded_distance_func(word, algorithm, engine) for word in queries]
+    word_lengths = [len(word) for word in queries]
+    bounds = [max_distance] * len(queries)
+    # Для каждого слова: все совпадения (без top_k) или куча худших из топа, как в fuzzy_search
+    found: List[list] = [[] for _ in queries]
+    visited = 0
+    processed = 0
+
+    # Корзины по длине общие: сначала те, что ближе к длине хоть одного слова запроса
+    def gap(length: int) -> int:
+        return min(abs(length - word_length) for word_length in word_lengths)
+
+    for length in sorted(vocabulary.buckets, key=gap):
+        bucket = vocabulary.buckets[length]
+        if max_distance is not None and gap(length) > max_distance:
+            break
+        for index in bucket:
+            processed += 1
+            if progress is not None and processed % PROGRESS_STEP == 0:
+                progress(processed, len(tokens))
+            token = None
+            for query, word in enumerate(queries):
+                bound = bounds[query]
+                word_length = word_lengths[query]
+                if bound is not None and abs(length - word_length) > bound:
+                    continue
+                if token is None:
+                    token = tokens[index]
+                visited += 1
+                distance = distance_funcs[query](word, token, length + word_length if bound is None else bound)
+                if bound is not None and distance > bound:
+                    continue
+
+                heap = found[query]
+                if top_k is None:
+                    heap.append((distance, index))
+                    continue
+                if len(heap) < top_k:
+                    heapq.heappush(heap, (-distance, -index))
+                elif (distance, index) < (-heap[0][0], -heap[0][1]):
+                    heapq.heapreplace(heap, (-distance, -index))
+                else:
+                    continue
+                if len(heap) == top_k:
+                    worst = -heap[0][0]
+                    bounds[query] = worst if max_distance is None else min(max_distance, worst)
+
+    if stats is not None:
+        stats["visited"] = visited
+    if progress is not None:
+        progress(len(tokens), len(tokens))
+    results = {}
+    for word, heap in zip(queries, found):
+        matches = heap if top_k is None else [(-distance, -index) for distance, index in heap]
+        matches.sort()
+        results[word] = [(tokens[index], distance, frequencies[index]) for distance, index in matches]
+    return [results[word] for word in words]
+
+
+def _batch_per_word(
+    words: List[str],
+    queries: List[str],
+    vocabulary: Vocabulary,
+    algorithm: str,
+    engine: str,
+    max_distance: Optional[int],
+    top_k: Optional[int],
+    bktree: Optional["BKTree"],
+    stats: Optional[dict],
+    symspell: Optional["SymSpellIndex"],
+    progress: Optional[ProgressCallback],
+) -> List[List[Tuple[str, int, int]]]:
+    # Пакет через индекс или NumPy-ядро: слова ищутся по очереди, прогресс - по всему пакету
+    total = len(queries) * len(vocabulary)
+    results = {}
+    visited = 0
+    for position, word in enumerate(queries):
+        offset = position * len(vocabulary)
+        word_stats = {}
+        word_progress = None
+        if progress is not None:
+            word_progress = lambda processed, _, offset=offset: progress(offset + processed, total)
+        results[word] = fuzzy_search(
+            word, vocabulary, algorithm, engine, max_distance, top_k,
+            bktree=bktree, stats=word_stats, symspell=symspell, progress=word_progress,
+        )
+        visited += word_stats.get("visited", 0)
+        if progress is not None:
+            progress(offset + len(vocabulary), total)
+    if stats is not None:
+        stats["visited"] = visited
+    return [results[word] for word in words]
+
+
+def _bktree_search(
+    word: str,
+    vocabulary: Vocabulary,
+    algorithm: str,
+    bktree: "BKTree",
+    max_distance: int,
+    top_k: Optional[int],
+    stats: Optional[dict],
+) -> List[Tuple[str, int, int]]:
+    if algorithm == "levenshtein":
+        matches, visited = bktree.search(word, max_distance)
+    elif algorithm == "damerau-levenshtein":
+        # Дерево построено по Левенштейну, а он не больше удвоенного OSA-расстояния
+        candidates, visited = bktree.search(word, 2 * max_distance)
+        matches = []
+        for _, index in candidates:
+            distance = damerau_levenshtein_distance_bounded(word, vocabulary.tokens[index], max_distance)
+            if distance <= max_distance:
+                matches.append((distance, index))
+    else:
+        raise ValueError("Unsupported algorithm")
+    return _collect_matches(vocabulary, matches, visited, top_k, stats)
+
+
+def _collect_matches(
+    vocabulary: Vocabulary,
+    matches: List[Tuple[int, int]],
+    visited: int,
+    top_k: Optional[int],
+    stats: Optional[dict],
+) -> List[Tuple[str, int, int]]:
+    # matches - пары (расстояние, индекс токена) в произвольном порядке
+    if stats is not None:
+        stats["visited"] = visited
+    if top_k is not None:
+        matches = heapq.nsmallest(max(top_k, 0), matches)
+    else:
+        matches.sort()
+    return [(vocabulary.tokens[index], distance, vocabulary.frequencies[index]) for distance, index in matches]
+
+
+def merge_search_results(
+    shard_results: List[List[Tuple[str, int, int, int]]],
+    top_k: Optional[int] = None,
+) -> List[Tuple[str, int, int]]:
+    # Слияние отсортированных результатов шардов: строки (токен, расстояние, частота, позиция),
+    # позиция - индекс токена в полном словаре, чтобы порядок совпадал с поиском без шардов
+    merged = heapq.merge(*shard_results, key=lambda row: (row[1], row[3]))
+    if top_k is not None:
+        merged = itertools.islice(merged, max(top_k, 0))
+    return [(token, distance, count) for token, distance, count, _ in merged]
@@ -0,0 +1,118 @@
+# app/services/symspell.py
+import os
+import sys
+from typing import Dict, List, Optional, Set, Tuple
+from app.services.index_files import load_json, save_json_atomic
+from app.services.services import levenshtein_distance_bounded
+from app.services.vocabulary import Vocabulary
+
+
+def generate_deletes(word: str, max_distance: int) -> Set[str]:
+    # Все строки, получаемые из word удалением не более max_distance символов (включая само слово)
+    deletes = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        next_frontier = set()
+        for candidate in frontier:
+            for i in range(len(candidate)):
+                deleted = candidate[:i] + candidate[i + 1:]
+                if deleted not in deletes:
+                    deletes.add(deleted)
+                    next_frontier.add(deleted)
+        frontier = next_frontier
+    return deletes
+
+
+# Удаления строятся только от первых PREFIX_LENGTH символов, как в SymSpell: у слова длины L
+# вариантов не больше сумм C(PREFIX_LENGTH, i) для i <= k, а не C(L, i), поэтому длинные
+# токены и запросы не раздувают память. Общий вариант префиксов при расстоянии <= k
+# тоже находится не более чем за k удалений с каждой стороны, точность не теряется
+PREFIX_LENGTH = 7
+
+
+# Индекс симметричного удаления (SymSpell): вариант-удаление -> индексы токенов словаря.
+# Если расстояние Левенштейна между словами <= k, у них есть общий вариант,
+# полученный не более чем k удалениями с каждой стороны, поэтому поиск точен при
+# max_distance <= self.max_distance, а перебирать весь словарь не нужно
+class SymSpellIndex:
+    def __init__(
+        self,
+        vocabulary: Vocabulary,
+        max_distance: int,
+        deletes: Dict[str, List[int]],
+        memory_bytes: int,
+        prefix_length: Optional[int] = PREFIX_LENGTH,
+    ):
+        self.vocabulary = vocabulary
+        self.max_distance = max_distance
+        self.deletes = deletes
+        self.memory_bytes = memory_bytes
+        self.prefix_length = prefix_length  # None - удаления от слова целиком (старые файлы индекса)
+
+    @classmethod
+    def build(
+        cls,
+        vocabulary: Vocabulary,
+        max_distance: int,
+        max_memory_bytes: Optional[int] = None,
+        prefix_length: int = PREFIX_LENGTH,
+    ) -> "SymSpellIndex":
+        deletes: Dict[str, List[int]] = {}
+        memory_bytes = sys.getsizeof(deletes)
+        for index, token in enumerate(vocabulary.tokens):
+            for deleted in generate_deletes(token[:prefix_length], max_distance):
+                indices = deletes.get(deleted)
+                if indices is None:
+                    deletes[deleted] = [index]
+                    # Ключ, пустой список и слот в хеш-таблице
+                    memory_bytes += sys.getsizeof(deleted) + sys.getsizeof([]) + 3 * 8
+                else:
+                    indices.append(index)
+                memory_bytes += 8
+            if max_memory_bytes is not None and memory_bytes > max_memory_bytes:
+                raise ValueError(
+                    f"SymSpell index exceeds memory limit: {memory_bytes} > {max_memory_bytes} bytes"
+                )
+        return cls(vocabulary, max_distance, deletes, memory_bytes, prefix_length)
+
+    def search(self, word: str, max_distance: int) -> Tuple[List[Tuple[int, int]], int]:
+        # Возвращает пары (расстояние, индекс токена) и число проверенных кандидатов
+        if max_distance > self.max_distance:
+            raise ValueError("max_distance exceeds the distance the index was built for")
+
+        word_length = len(word)
+        tokens = self.vocabulary.tokens
+        candidates = set()
+        for deleted in generate_deletes(word[:self.prefix_length], max_distance):
+            candidates.update(self.deletes.get(deleted, ()))
+
+        matches = []
+        for index in candidates:
+            token = tokens[index]
+            if abs(len(token) - word_length) > max_distance:
+                continue
+            distance = levenshtein_distance_bounded(word, token, max_distance)
+            if distance <= max_distance:
+                matches.append((distance, index))
+        return matches, len(candidates)
+
+    def save(self, path: str):
+        save_json_atomic(path, {
+            "size": len(self.vocabulary),
+            "max_distance": self.max_distance,
+            "memory_bytes": self.memory_bytes,
+            "prefix_length": self.prefix_length,
+            "deletes": self.deletes,
+        })
+
+    @classmethod
+    def load(cls, path: str, vocabulary: Vocabulary) -> Optional["SymSpellIndex"]:
+        data = load_json(path)
+        if data is None or data.get("size") != len(vocabulary):
+            return None
+        return cls(vocabulary, data["max_distance"], data["deletes"], data["memory_bytes"], data.get("prefix_length"))
+
+
+def symspell_index_path(index_dir: str, key: str) -> str:
+    # key - хеш содержимого корпуса
+    return os.path.join(index_dir, f"symspell_{key}.json")
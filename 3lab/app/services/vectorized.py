@@ -0,0 +1,93 @@
+# app/services/vectorized.py
+from typing import Callable, Dict, List, Optional, Tuple
+from app.services.vocabulary import Vocabulary
+
+try:
+    import numpy as np
+except ImportError:  # NumPy не обязателен: без него поиск идёт чистым Python
+    np = None
+
+
+def numpy_available() -> bool:
+    return np is not None
+
+
+def pack_vocabulary(vocabulary: Vocabulary) -> Dict[int, Tuple["np.ndarray", "np.ndarray"]]:
+    # Длина -> (матрица кодов символов uint32 размером n x длина, индексы токенов в словаре).
+    # Внутри группы все слова одной длины, поэтому матрица прямоугольная без выравнивания.
+    # Упаковка делается один раз на словарь и кэшируется в нём
+    if vocabulary.packed is None:
+        packed = {}
+        for length, indices in vocabulary.buckets.items():
+            tokens = "".join(vocabulary.tokens[index] for index in indices)
+            codes = np.frombuffer(tokens.encode("utf-32-le"), dtype=np.uint32).reshape(len(indices), length)
+            packed[length] = (codes, np.array(indices, dtype=np.int64))
+        vocabulary.packed = packed
+    return vocabulary.packed
+
+
+def numpy_levenshtein_distances(
+    word: str,
+    vocabulary: Vocabulary,
+    max_distance: Optional[int] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Tuple[List[Tuple[int, int]], int]:
+    # Пакетная ДП: строка матрицы (по символам запроса) продвигается сразу для всех слов группы.
+    # Вставки внутри строки считаются без цикла по столбцам:
+    # cur[j] = min_k(a[k] + j - k) = j + cummin(a[k] - k)
+    # Возвращает пары (расстояние, индекс токена) в пределах порога и число проверенных слов
+    word_length = len(word)
+    query = np.frombuffer(word.encode("utf-32-le"), dtype=np.uint32)
+    matches = []
+    visited = 0
+    processed = 0
+
+    for length, (codes, indices) in pack_vocabulary(vocabulary).items():
+        processed += len(indices)
+        if max_distance is not None and abs(length - word_length) > max_distance:
+            continue
+        visited += len(indices)
+        if word_length == 0 or length == 0:
+            distances = np.full(len(indices), max(word_length, length), dtype=np.int32)
+        else:
+            distances, indices = _group_distances(query, codes, indices, max_distance)
+        if max_distance is not None:
+            keep = distances <= max_distance
+            distances, indices = distances[keep], indices[keep]
+        matches.extend(zip(distances.tolist(), indices.tolist()))
+        if progress is not None:
+            progress(processed, len(vocabulary))
+
+    if progress is not None:
+        progress(len(vocabulary), len(vocabulary))
+
+    return matches, visited
+
+
+def _group_distances(query: "np.ndarray", codes: "np.ndarray", indices: "np.ndarray", max_distance: Optional[int]):
+    length = codes.shape[1]
+    offsets = np.arange(length + 1, dtype=np.int32)
+    previous_row = np.broadcast_to(offsets, (codes.shape[0], length + 1))
+
+    for i, c in enumerate(query, start=1):
+        row = np.empty_like(previous_row)
+        row[:, 0] = i
+        np.minimum(
+            previous_row[:, :-1] + (codes != c),  # substitution
+            previous_row[:, 1:] + 1,              # deletion
+            out=row[:, 1:],
+        )
+        row -= offsets
+        np.minimum.accumulate(row, axis=1, out=row)
+        row += offsets                            # insertion
+        previous_row = row
+
+        if max_distance is not None:
+            # Слова, у которых минимум строки уже больше порога, дальше не считаем
+            alive = row.min(axis=1) <= max_distance
+            if not alive.all():
+                previous_row, codes, indices = row[alive], codes[alive], indices[alive]
+                if not len(indices):
+                    break
+
+    return previous_row[:, -1], indices
@@ -0,0 +1,109 @@
+# app/services/vocabulary.py
+import codecs
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+# Словарь корпуса: уникальные токены в порядке первого появления,
+# их частоты и корзины по длине (длина -> индексы токенов по возрастанию)
+class Vocabulary:
+    def __init__(self, tokens: List[str], frequencies: List[int]):
+        self.tokens = tokens
+        self.frequencies = frequencies
+        self.buckets: Dict[int, List[int]] = {}
+        self.packed = None  # Группы кодов символов для NumPy-ядра (см. vectorized.py)
+        for index, token in enumerate(tokens):
+            self.buckets.setdefault(len(token), []).append(index)
+
+    @classmethod
+    def from_counts(cls, counts: Dict[str, int]) -> "Vocabulary":
+        return cls(list(counts), list(counts.values()))
+
+    @classmethod
+    def from_text(cls, text: str) -> "Vocabulary":
+        return cls.from_counts(count_tokens(text.split()))
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def items(self) -> Iterator[Tuple[str, int]]:
+        return zip(self.tokens, self.frequencies)
+
+    def shard(self, shard_index: int, shard_count: int) -> "Vocabulary":
+        # Токены берутся через один (i, i + n, ...), чтобы длины распределились по шардам равномерно.
+        # Токен с индексом j в шарде имеет индекс j * shard_count + shard_index в полном словаре
+        return Vocabulary(self.tokens[shard_index::shard_count], self.frequencies[shard_index::shard_count])
+
+    def candidate_indices(self, word_length: int, max_distance: Optional[int] = None) -> Iterator[int]:
+        # Сначала корзины с длиной ближе к длине запроса: они быстрее заполняют топ
+        # хорошими кандидатами, и порог отсечения сужается раньше
+        for length in sorted(self.buckets, key=lambda length: abs(length - word_length)):
+            if max_distance is not None and abs(length - word_length) > max_distance:
+                break
+            yield from self.buckets[length]
+
+
+def count_tokens(tokens: Iterable[str], counts: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+    # dict сохраняет порядок вставки, поэтому токены остаются в порядке первого появления
+    if counts is None:
+        counts = {}
+    for token in tokens:
+        counts[token] = counts.get(token, 0) + 1
+    return counts
+
+
+class TokenTooLongError(ValueError):
+    pass
+
+
+# Построение словаря по частям текста (потоковая загрузка корпуса).
+# Токен, разрезанный границей куска, откладывается до следующего куска,
+# поэтому результат совпадает с Vocabulary.from_text для всего текста целиком.
+# Части отложенного токена копятся списком и склеиваются один раз, когда токен кончился:
+# иначе текст без пробелов копировался бы на каждом куске. max_token_length ограничивает
+# отложенный токен, чтобы такой текст не оказался в памяти целиком (TokenTooLongError)
+class VocabularyBuilder:
+    def __init__(self, max_token_length: Optional[int] = None):
+        self.counts: Dict[str, int] = {}
+        self.tail: List[str] = []
+        self.tail_length = 0
+        self.max_token_length = max_token_length
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def feed_bytes(self, chunk: bytes):
+        # UnicodeDecodeError, если байты не UTF-8
+        self.feed(self.decoder.decode(chunk))
+
+    def feed(self, text: str):
+        if not text:
+            return
+        tokens = text.split()
+        if self.tail and tokens and not text[0].isspace():
+            if len(tokens) == 1 and not text[-1].isspace():
+                # Весь кусок - продолжение отложенного токена
+                self._extend_tail(tokens[0])
+                return
+            tokens[0] = self._take_tail() + tokens[0]
+        elif self.tail:
+            count_tokens([self._take_tail()], self.counts)
+        # Если кусок не кончается пробельным символом, последний токен может продолжиться
+        if tokens and not text[-1].isspace():
+            self._extend_tail(tokens.pop())
+        count_tokens(tokens, self.counts)
+
+    def _extend_tail(self, piece: str):
+        self.tail.append(piece)
+        self.tail_length += len(piece)
+        if self.max_token_length is not None and self.tail_length > self.max_token_length:
+            raise TokenTooLongError(f"Token longer than {self.max_token_length} characters")
+
+    def _take_tail(self) -> str:
+        token = "".join(self.tail)
+        self.tail = []
+        self.tail_length = 0
+        return token
+
+    def finish(self) -> Vocabulary:
+        self.feed(self.decoder.decode(b"", final=True))
+        if self.tail:
+            count_tokens([self._take_tail()], self.counts)
+        return Vocabulary.from_counts(self.counts)
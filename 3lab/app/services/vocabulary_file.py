@@ -0,0 +1,158 @@
+# app/services/vocabulary_file.py
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from typing import Iterator, List, Optional, Union
+from app.services.vocabulary import Vocabulary
+from app.services.vectorized import np
+
+# Словарь корпуса на диске в виде, пригодном для mmap без разбора.
+# Все числа little-endian, каждая секция выровнена на 8 байт:
+#   заголовок  magic, версия, число корзин, число токенов, смещения трёх таблиц ниже
+#   корзины    (длина, число токенов, смещение кодов, смещение индексов) по возрастанию длины
+#   частоты    int64 на токен, в порядке словаря (первое появление в тексте)
+#   позиции    int64 на токен: смещение его кодов в файле
+#   длины      uint32 на токен
+#   по каждой корзине: коды символов UTF-32 (n x длина, как в pack_vocabulary)
+#   и индексы её токенов в словаре (int64, по возрастанию)
+# Воркеры на одной машине открывают один файл и делят его страницы через кэш ОС:
+# строки токенов создаются только при обращении, а NumPy-ядро читает коды прямо из файла
+MAGIC = b"FZVOCAB\0"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQQQ")
+BUCKET = struct.Struct("<IIQQ")
+
+
+def vocabulary_file_path(index_dir: str, key: str) -> str:
+    # key - хеш содержимого корпуса
+    return os.path.join(index_dir, f"vocabulary_{key}.bin")
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _int_array(typecode: str, values) -> bytes:
+    data = array(typecode, values)
+    if sys.byteorder == "big":
+        data.byteswap()
+    return data.tobytes()
+
+
+def write_vocabulary_file(path: str, vocabulary: Vocabulary):
+    # Пишется во временный файл рядом и переименовывается: читатели не видят файл наполовину
+    tokens = vocabulary.tokens
+    count = len(tokens)
+    lengths = sorted(vocabulary.buckets)
+
+    frequencies_offset = _align(HEADER.size + BUCKET.size * len(lengths))
+    positions_offset = frequencies_offset + 8 * count
+    lengths_offset = positions_offset + 8 * count
+    offset = _align(lengths_offset + 4 * count)
+
+    buckets = []
+    positions = [0] * count
+    for length in lengths:
+        indices = vocabulary.buckets[length]
+        codes_offset = offset
+        for slot, index in enumerate(indices):
+            positions[index] = codes_offset + 4 * length * slot
+        indices_offset = _align(codes_offset + 4 * length * len(indices))
+        offset = indices_offset + 8 * len(indices)
+        buckets.append((length, indices, codes_offset, indices_offset))
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(buckets), count, frequencies_offset, positions_offset, lengths_offset))
+            for length, indices, codes_offset, indices_offset in buckets:
+                f.write(BUCKET.pack(length, len(indices), codes_offset, indices_offset))
+            f.write(b"\0" * (frequencies_offset - f.tell()))
+            f.write(_int_array("q", vocabulary.frequencies))
+            f.write(_int_array("q", positions))
+            f.write(_int_array("I", (len(token) for token in tokens)))
+            for length, indices, codes_offset, indices_offset in buckets:
+                f.write(b"\0" * (codes_offset - f.tell()))
+                f.write("".join(tokens[index] for index in indices).encode("utf-32-le"))
+                f.write(b"\0" * (indices_offset - f.tell()))
+                f.write(_int_array("q", indices))
+        os.chmod(tmp_path, 0o644)  # mkstemp создаёт файл 0600, а читать его будут все воркеры
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# Токены словаря поверх mmap: строка декодируется из UTF-32 при обращении и нигде не хранится
+class MappedTokens:
+    def __init__(self, buffer: mmap.mmap, positions: memoryview, lengths: memoryview):
+        self.buffer = buffer
+        self.positions = positions
+        self.lengths = lengths
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[str, List[str]]:
+        if isinstance(index, slice):
+            # Срез (шард словаря) - обычный список строк
+            return [self[i] for i in range(*index.indices(len(self)))]
+        start = self.positions[index]
+        return str(self.buffer[start:start + 4 * self.lengths[index]], "utf-32-le")
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(len(self)):
+            yield self[index]
+
+
+# Словарь, открытый из файла write_vocabulary_file. Ведёт себя как Vocabulary:
+# tokens, frequencies и корзины индексируются так же, но лежат в отображённом файле,
+# а не в куче процесса. Корзины - memoryview над индексами, packed - массивы NumPy над кодами
+class MappedVocabulary(Vocabulary):
+    def __init__(self, buffer: mmap.mmap):
+        magic, version, bucket_count, count, frequencies_offset, positions_offset, lengths_offset = (
+            HEADER.unpack_from(buffer, 0)
+        )
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a vocabulary file")
+        if lengths_offset + 4 * count > len(buffer):
+            raise ValueError("Truncated vocabulary file")
+        view = memoryview(buffer)
+        self.buffer = buffer
+        self.frequencies = view[frequencies_offset:frequencies_offset + 8 * count].cast("q")
+        self.tokens = MappedTokens(
+            buffer,
+            view[positions_offset:positions_offset + 8 * count].cast("q"),
+            view[lengths_offset:lengths_offset + 4 * count].cast("I"),
+        )
+        self.buckets = {}
+        packed = {}
+        for i in range(bucket_count):
+            length, size, codes_offset, indices_offset = BUCKET.unpack_from(buffer, HEADER.size + BUCKET.size * i)
+            self.buckets[length] = view[indices_offset:indices_offset + 8 * size].cast("q")
+            if np is not None:
+                codes = np.frombuffer(buffer, dtype=np.uint32, count=size * length, offset=codes_offset)
+                indices = np.frombuffer(buffer, dtype=np.int64, count=size, offset=indices_offset)
+                packed[length] = (codes.reshape(size, length), indices)
+        self.packed = packed if np is not None else None
+
+    @classmethod
+    def open(cls, path: str) -> Optional["MappedVocabulary"]:
+        # None, если файла нет, он повреждён или порядок байт машины не little-endian
+        if sys.byteorder != "little" or not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            try:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # Пустой файл
+                return None
+        try:
+            return cls(buffer)
+        except (ValueError, struct.error, TypeError):
+            return None
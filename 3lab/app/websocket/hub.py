@@ -0,0 +1,137 @@
+# app/websocket/hub.py
+import asyncio
+from collections import deque
+from typing import Dict, Optional, Set, Tuple, Union
+from app.core.codec import decode_message, encode_message, resolve_encoding
+from app.celery.notifications import COALESCED_STATUSES
+
+CHANNEL_PREFIX = "ws_notifications:"
+
+
+# Ограниченная очередь уведомлений одного сокета.
+# При переполнении первым выбрасывается самый старый PROGRESS или PARTIAL: он всё равно
+# устарел, а STARTED/COMPLETED терять нельзя. Если таких в очереди нет,
+# новый PROGRESS/PARTIAL просто не кладётся; иначе вытесняется самое старое сообщение.
+# encoding - формат, в котором сокет получает сообщения ("json" - текст, "msgpack" - байты)
+class NotificationQueue:
+    def __init__(self, maxsize: int, encoding: str = "json"):
+        self.maxsize = maxsize
+        self.encoding = resolve_encoding(encoding)
+        self.items = deque()  # тройки (data, is_progress, published_at)
+        self.ready = asyncio.Event()
+        self.dropped = 0
+
+    def put_nowait(self, data: Union[str, bytes], is_progress: bool, published_at: Optional[float] = None):
+        if len(self.items) >= self.maxsize:
+            self.dropped += 1
+            for item in self.items:
+                if item[1]:
+                    self.items.remove(item)
+                    break
+            else:
+                if is_progress:
+                    return
+                self.items.popleft()
+        self.items.append((data, is_progress, published_at))
+        self.ready.set()
+
+    async def get(self) -> Tuple[Union[str, bytes], Optional[float]]:
+        # Возвращает сообщение и время его публикации (для метрики задержки доставки)
+        while not self.items:
+            self.ready.clear()
+            await self.ready.wait()
+        data, _, published_at = self.items.popleft()
+        return data, published_at
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+# Общая на процесс подписка на Redis: один psubscribe на ws_notifications:*
+# вместо отдельного соединения на каждый сокет. Сообщения раскладываются
+# по очередям сокетов пользователя (у пользователя может быть несколько сокетов)
+class NotificationHub:
+    def __init__(self, redis_client, queue_size: int):
+        self.redis_client = redis_client
+        self.queue_size = queue_size
+        self.subscribers: Dict[int, Set[NotificationQueue]] = {}
+        self.listener_task: Optional[asyncio.Task] = None
+        self.subscribed = asyncio.Event()
+
+    async def start(self):
+        if self.listener_task is None or self.listener_task.done():
+            self.subscribed.clear()
+            self.listener_task = asyncio.create_task(self._listen())
+            # Ждём подписку, чтобы не потерять сообщения, опубликованные сразу после подключения
+            try:
+                await asyncio.wait_for(self.subscribed.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                print("Notification hub is not subscribed yet, continuing in background")
+
+    async def stop(self):
+        if self.listener_task is not None:
+            self.listener_task.cancel()
+            await asyncio.gather(self.listener_task, return_exceptions=True)
+            self.listener_task = None
+
+    async def subscribe(self, user_id: int, encoding: str = "json") -> NotificationQueue:
+        await self.start()
+        queue = NotificationQueue(self.queue_size, encoding)
+        self.subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: NotificationQueue):
+        queues = self.subscribers.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self.subscribers[user_id]
+
+    def dispatch(self, user_id: int, data: bytes):
+        queues = self.subscribers.get(user_id)
+        if not queues:
+            return
+        # Воркеры публикуют JSON или msgpack; сообщение разбирается один раз,
+        # а в каждом нужном сокетам формате кодируется не больше одного раза
+        try:
+            message = decode_message(data)
+            is_progress = message.get("status") in COALESCED_STATUSES
+            published_at = message.get("published_at")
+        except (ValueError, AttributeError) as e:
+            print(f"Notification hub skipped undecodable message: {e}")
+            return
+        payloads = {"json" if data[:1] == b"{" else "msgpack": data}
+        if "json" in payloads:
+            payloads["json"] = data.decode("utf-8")
+        for queue in queues:
+            payload = payloads.get(queue.encoding)
+            if payload is None:
+                payload = payloads[queue.encoding] = encode_message(message, queue.encoding)
+            queue.put_nowait(payload, is_progress, published_at)
+
+    async def _listen(self):
+        while True:
+            pubsub = self.redis_client.pubsub()
+            try:
+                await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                self.subscribed.set()
+                print(f"Notification hub subscribed to {CHANNEL_PREFIX}*")
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    channel = message["channel"].decode("utf-8")
+                    try:
+                        user_id = int(channel[len(CHANNEL_PREFIX):])
+                    except ValueError:
+                        continue
+                    self.dispatch(user_id, message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Соединение с Redis потеряно: переподписываемся
+                print(f"Notification hub error: {e}. Reconnecting in 1 second...")
+                await asyncio.sleep(1)
+            finally:
+                self.subscribed.clear()
+                await pubsub.aclose()
@@ -1,52 +1,74 @@
 # websocket/websocket.py
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
-from app.db.db import get_db
-from sqlalchemy.orm import Session
-from app.auth.auth import get_current_user
+from app.auth.auth import get_current_user_short_session
 from app.models.models import User
-import redis
-import json
+import redis.asyncio as aioredis
 import asyncio
+import time
 from app.core.config import settings
+from app.core.metrics import ws_delivery_latency_ms
+from app.websocket.hub import NotificationHub
 
 router = APIRouter()
 
-try:
-    redis_client = redis.Redis.from_url(settings.REDIS_URL)
-    print("Connected to Redis successfully")
-except redis.ConnectionError as e:
-    print(f"Failed to connect to Redis: {e}")
-    raise
+# Асинхронный клиент: ожидание сообщений из Redis не блокирует цикл событий
+redis_client = aioredis.Redis.from_url(settings.REDIS_URL)
+
+# Одна подписка на Redis на весь процесс, сокеты получают сообщения из своих очередей
+hub = NotificationHub(redis_client, settings.WS_QUEUE_SIZE)
+
 
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def websocket_endpoint(
+    websocket: WebSocket, encoding: str = "json",
+    user: User = Depends(get_current_user_short_session),
+):
     await websocket.accept()
-    print(f"WebSocket connected for user: {user.username}, user_id: {user.id}")
+    print(f"WebSocket connected for user: {user.username}, user_id: {user.id}, encoding: {encoding}")
 
-    pubsub = redis_client.pubsub()
-    channel = f"ws_notifications:{user.id}"
-    pubsub.subscribe(channel)
-    print(f"Subscribed to Redis channel: {channel}")
+    # /ws?encoding=msgpack - уведомления приходят бинарными msgpack-кадрами (если msgpack установлен)
+    queue = await hub.subscribe(user.id, encoding)
 
-    try:
+    async def forward_notifications():
+        # Сообщение уходит в сокет сразу, как только появилось в очереди
         while True:
-            message = pubsub.get_message(timeout=10.0)  # Увеличиваем таймаут
-            if message and message["type"] == "message":
-                data = message["data"].decode("utf-8")
-                print(f"Received from Redis: {data}")
+            data, published_at = await queue.get()
+            if isinstance(data, bytes):
+                await websocket.send_bytes(data)
+            else:
                 await websocket.send_text(data)
-            # Пинг-понг для поддержания соединения
-            try:
-                await websocket.send_text("ping")
-                await asyncio.sleep(5)  # Пинг каждые 5 секунд
-            except Exception as e:
-                print(f"Ошибка пинг-понг: {e}")
-                break
-            await asyncio.sleep(0.1)
+            if published_at is not None:
+                ws_delivery_latency_ms.observe((time.time() - published_at) * 1000)
+
+    async def send_pings():
+        # Пинг-понг для поддержания соединения на своём таймере, доставку уведомлений не задерживает
+        while True:
+            await asyncio.sleep(settings.WS_PING_INTERVAL)
+            await websocket.send_text("ping")
+
+    async def wait_for_disconnect():
+        # Клиент ничего не шлёт, но чтение нужно, чтобы сразу заметить закрытие сокета
+        while True:
+            await websocket.receive_text()
+
+    tasks = [
+        asyncio.create_task(forward_notifications()),
+        asyncio.create_task(send_pings()),
+        asyncio.create_task(wait_for_disconnect()),
+    ]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
     except WebSocketDisconnect as e:
         print(f"WebSocket disconnected for user: {user.username}. Код: {e.code}, Причина: {e.reason}")
     except Exception as e:
         print(f"Ошибка WebSocket: {e}")
     finally:
-        pubsub.unsubscribe(channel)
-        print(f"Unsubscribed from Redis channel: {channel}")
\ No newline at end of file
+        for task in tasks:
+            task.cancel()
+        hub.unsubscribe(user.id, queue)
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if queue.dropped:
+            print(f"Dropped {queue.dropped} notifications for slow WebSocket of user: {user.username}")
+        print(f"WebSocket closed for user: {user.username}")
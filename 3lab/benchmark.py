@@ -0,0 +1,77 @@
+# benchmark.py
+# Сравнение движков поиска на синтетическом корпусе:
+#   python benchmark.py --words 50000 --queries 20
+# Сколько узлов обходит BK-дерево против полного скана:
+#   python benchmark.py --visited
+import argparse
+import random
+import time
+
+from app.services.bktree import BKTree
+from app.services.services import fuzzy_search
+from app.services.vocabulary import Vocabulary
+
+ALPHABET = "абвгдеёжзиклмнопрст"
+
+
+def make_corpus(words: int, seed: int) -> str:
+    rng = random.Random(seed)
+    return " ".join(
+        "".join(rng.choice(ALPHABET) for _ in range(rng.randint(2, 12)))
+        for _ in range(words)
+    )
+
+
+def compare_visited(vocabulary: Vocabulary, queries: list, algorithm: str, distances: list):
+    # stats["visited"] - число посчитанных расстояний: у скана с порогом и у дерева
+    start = time.perf_counter()
+    tree = BKTree.build(vocabulary)
+    print(f"BK-дерево построено за {time.perf_counter() - start:.1f} с")
+    for max_distance in distances:
+        visited = {}
+        for name, bktree in (("scan", None), ("bktree", tree)):
+            stats = {}
+            for query in queries:
+                fuzzy_search(query, vocabulary, algorithm, max_distance=max_distance, bktree=bktree, stats=stats)
+            visited[name] = stats.get("visited", 0) / len(queries)
+        share = visited["bktree"] / visited["scan"] if visited["scan"] else 0.0
+        print(
+            f"max_distance={max_distance}: scan {visited['scan']:9.0f}, "
+            f"bktree {visited['bktree']:9.0f} узлов на запрос ({share:.0%})"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк движков нечёткого поиска")
+    parser.add_argument("--words", type=int, default=50000, help="Слов в синтетическом корпусе")
+    parser.add_argument("--queries", type=int, default=10, help="Сколько запросов на движок")
+    parser.add_argument("--algorithm", default="levenshtein")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--visited", action="store_true", help="Сравнить обход BK-дерева и скана")
+    parser.add_argument("--distances", type=int, nargs="+", default=[0, 1, 2, 3], help="Пороги для --visited")
+    args = parser.parse_args()
+
+    vocabulary = Vocabulary.from_text(make_corpus(args.words, args.seed))
+    rng = random.Random(args.seed + 1)
+    queries = rng.sample(vocabulary.tokens, min(args.queries, len(vocabulary)))
+    print(f"Корпус: {args.words} слов, {len(vocabulary)} уникальных; запросов: {len(queries)}")
+    if args.visited:
+        compare_visited(vocabulary, queries, args.algorithm, args.distances)
+        return
+
+    baseline = None
+    for engine in ("python", "bitparallel"):
+        start = time.perf_counter()
+        results = [fuzzy_search(query, vocabulary, args.algorithm, engine) for query in queries]
+        elapsed = (time.perf_counter() - start) / len(queries)
+        # Движки должны давать одинаковые расстояния
+        distances = [[distance for _, distance, _ in result] for result in results]
+        if baseline is None:
+            baseline = distances
+        elif distances != baseline:
+            raise SystemExit(f"Движок {engine} дал другие расстояния")
+        print(f"{engine:12} {elapsed * 1000:9.1f} мс на запрос")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# benchmark_api.py
+# Пропускная способность API без сети: запросы идут в приложение через httpx.ASGITransport,
+# поэтому измеряются обработчики, зависимости и БД, а не uvicorn и сокеты.
+# Нужен httpx (pip install httpx); база - та же, что в настройках (DATABASE_URL):
+#   python benchmark_api.py --requests 500 --concurrency 50
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+from main import app
+from app.db.db import engine
+from app.models.models import Base
+
+
+async def run_requests(client: httpx.AsyncClient, count: int, concurrency: int, send) -> list:
+    # Не больше concurrency запросов одновременно; возвращает задержки в секундах
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await send(client, i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise SystemExit(f"{response.request.url.path}: HTTP {response.status_code} {response.text}")
+
+    await asyncio.gather(*(one(i) for i in range(count)))
+    return latencies
+
+
+def report(name: str, latencies: list, elapsed: float):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(
+        f"{name:10} {len(latencies) / elapsed:9.1f} запросов/с, "
+        f"медиана {statistics.median(latencies) * 1000:7.1f} мс, p95 {p95 * 1000:7.1f} мс"
+    )
+
+
+async def measure(name: str, client: httpx.AsyncClient, count: int, concurrency: int, send):
+    start = time.perf_counter()
+    latencies = await run_requests(client, count, concurrency, send)
+    report(name, latencies, time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк /login и /corpuses через ASGITransport")
+    parser.add_argument("--requests", type=int, default=200, help="Запросов на каждый эндпоинт")
+    parser.add_argument("--logins", type=int, default=None, help="Запросов к /login (по умолчанию --requests)")
+    parser.add_argument("--concurrency", type=int, default=20, help="Сколько запросов одновременно")
+    parser.add_argument("--limit", type=int, default=100, help="Параметр limit для /corpuses")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    # Отдельный пользователь на каждый запуск, чтобы не зависеть от состояния базы
+    credentials = {"username": f"bench_{uuid.uuid4().hex[:12]}", "password": "bench-password"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        response = await client.post("/register", json=credentials)
+        if response.status_code != 200:
+            raise SystemExit(f"/register: HTTP {response.status_code} {response.text}")
+        response = await client.post("/login", json=credentials)
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        print(f"Запросов: {args.requests}, одновременно: {args.concurrency}")
+        # /login упирается в bcrypt: проверка пароля идёт в пуле потоков, цикл событий свободен
+        await measure(
+            "/login", client, args.logins or args.requests, args.concurrency,
+            lambda client, i: client.post("/login", json=credentials),
+        )
+        # /corpuses - проверка токена (кэш) и одна страница списка корпусов
+        await measure(
+            "/corpuses", client, args.requests, args.concurrency,
+            lambda client, i: client.get("/corpuses", params={"limit": args.limit}, headers=headers),
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
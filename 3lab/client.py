@@ -4,8 +4,14 @@ import asyncio
 import json
 import argparse
 
+try:
+    import msgpack
+except ImportError:  # Без msgpack уведомления приходят в JSON
+    msgpack = None
+
 BASE_URL = "http://127.0.0.1:8000"
-WS_URL = "ws://127.0.0.1:8000/ws"
+# С msgpack сервер шлёт уведомления компактными бинарными кадрами
+WS_URL = "ws://127.0.0.1:8000/ws" + ("?encoding=msgpack" if msgpack is not None else "")
 
 async def get_token(username: str, password: str) -> str:
     async with aiohttp.ClientSession() as session:
@@ -38,6 +44,11 @@ async def websocket_listener(token: str, queue: asyncio.Queue, stop_event: async
                                     await queue.put(parsed_data)
                                 except json.JSONDecodeError as e:
                                     print(f"Ошибка парсинга JSON: {e} для данных: '{data}'")
+                            elif msg.type == aiohttp.WSMsgType.BINARY:
+                                try:
+                                    await queue.put(msgpack.unpackb(msg.data, raw=False))
+                                except Exception as e:
+                                    print(f"Ошибка разбора msgpack: {e}")
                             elif msg.type == aiohttp.WSMsgType.CLOSED:
                                 print(f"WebSocket закрыт. Код: {ws.close_code if hasattr(ws, 'close_code') else 'Неизвестен'}")
                                 break
@@ -59,12 +70,73 @@ async def websocket_listener(token: str, queue: asyncio.Queue, stop_event: async
             print(f"Ошибка соединения WebSocket: {e}. Переподключение через 2 секунды...")
             await asyncio.sleep(2)
 
+def merge_search_update(searches: dict, notification: dict):
+    # Собирает топ задачи из PARTIAL-сообщений (промежуточные топы и топы шардов) по мере прихода.
+    # Топы объединяются по слову, поэтому порядок прихода шардов не важен; COMPLETED заменяет
+    # собранное, а PARTIAL, опоздавшие после него, игнорируются.
+    # Возвращает текущий топ задачи или None, если сообщение не про результаты
+    status = notification.get("status")
+    task_id = notification.get("task_id")
+    if status == "STARTED":
+        searches[task_id] = {"top_k": notification.get("top_k") or 10, "seq": 0, "done": False, "results": {}}
+        return None
+    if status not in ("PARTIAL", "COMPLETED"):
+        return None
+
+    if status == "COMPLETED":
+        if task_id is not None:  # task_id нет у ответа из кэша
+            searches[task_id] = {"seq": notification.get("seq", 0), "done": True}
+        return notification["results"]
+
+    search = searches.setdefault(task_id, {"top_k": 10, "seq": 0, "done": False, "results": {}})
+    if search["done"]:
+        return None
+    search["seq"] = max(search["seq"], notification.get("seq", 0))
+    for item in notification["results"]:
+        known = search["results"].get(item["word"])
+        if known is None or item["distance"] < known["distance"]:
+            search["results"][item["word"]] = item
+    return sorted(search["results"].values(), key=lambda item: item["distance"])[:search["top_k"]]
+
+def print_notification(searches: dict, notification: dict):
+    if notification.get("batch") and notification.get("status") == "COMPLETED":
+        # Итог пакетного поиска: свой топ для каждого слова запроса
+        print(f"Итог пакета [{notification.get('task_id')}]:")
+        for item in notification["results"]:
+            words = ", ".join(f"{result['word']} ({result['distance']})" for result in item["results"])
+            print(f"  {item['query']}: {words}")
+        return
+    top = merge_search_update(searches, notification)
+    if top is None:
+        print(f"Уведомление: {json.dumps(notification, indent=2)}")
+        return
+    label = "Итог" if notification["status"] == "COMPLETED" else "Промежуточный топ"
+    words = ", ".join(f"{item['word']} ({item['distance']})" for item in top)
+    print(f"{label} [{notification.get('task_id')}, seq {notification.get('seq')}]: {words}")
+
 async def send_search_request(token: str, word: str, corpus_id: int, algorithm: str):
     headers = {"Authorization": f"Bearer {token}"}
     async with aiohttp.ClientSession() as session:
         async with session.post(
             f"{BASE_URL}/search_algorithm",
-            json={"word": word, "corpus_id": corpus_id, "algorithm": algorithm},
+            # stream: промежуточные топы приходят по ходу поиска, не только в конце
+            json={"word": word, "corpus_id": corpus_id, "algorithm": algorithm, "stream": True},
+            headers=headers
+        ) as response:
+            if response.status != 200:
+                print(f"Ошибка поиска: {await response.text()}")
+                return None
+            data = await response.json()
+            print(f"Запрос отправлен: {data}")
+            return data
+
+async def send_batch_search_request(token: str, text: str, corpus_id: int, algorithm: str):
+    # Все слова текста ищутся одной задачей за один проход по словарю корпуса
+    headers = {"Authorization": f"Bearer {token}"}
+    async with aiohttp.ClientSession() as session:
+        async with session.post(
+            f"{BASE_URL}/search_batch",
+            json={"text": text, "corpus_id": corpus_id, "algorithm": algorithm},
             headers=headers
         ) as response:
             if response.status != 200:
@@ -85,11 +157,13 @@ async def interactive_mode():
     stop_event = asyncio.Event()
     ws_task = asyncio.create_task(websocket_listener(token, notification_queue, stop_event))
 
+    searches = {}
+
     async def process_notifications():
         while not stop_event.is_set():
             try:
                 notification = await notification_queue.get()
-                print(f"Уведомление: {json.dumps(notification, indent=2)}")
+                print_notification(searches, notification)
             except asyncio.CancelledError:
                 print("Обработка уведомлений завершена.")
                 break
@@ -99,7 +173,7 @@ async def interactive_mode():
     notification_task = asyncio.create_task(process_notifications())
 
     while True:
-        print("\nКоманды: search, exit")
+        print("\nКоманды: search, batch, exit")
         command = input("> ").strip().lower()
         if command == "exit":
             stop_event.set()
@@ -111,6 +185,11 @@ async def interactive_mode():
             corpus_id = int(input("Введите ID корпуса: "))
             algorithm = input("Введите алгоритм (например, levenshtein): ")
             await send_search_request(token, word, corpus_id, algorithm)
+        elif command == "batch":
+            text = input("Введите слова или текст для поиска: ")
+            corpus_id = int(input("Введите ID корпуса: "))
+            algorithm = input("Введите алгоритм (например, levenshtein): ")
+            await send_batch_search_request(token, text, corpus_id, algorithm)
         else:
             print("Неизвестная команда.")
         await asyncio.sleep(0.1)
@@ -142,6 +221,14 @@ async def script_mode(filename: str):
                 "corpus_id": int(parts[1].strip()),
                 "algorithm": parts[2].strip(),
             })
+        elif line.startswith("batch:"):
+            # batch: слова через пробел, corpus_id, алгоритм
+            parts = line.split(":", 1)[1].strip().split(",")
+            commands.append({
+                "text": parts[0].strip(),
+                "corpus_id": int(parts[1].strip()),
+                "algorithm": parts[2].strip(),
+            })
 
     if not username or not password:
         print("Не указаны username или password в скрипте.")
@@ -155,11 +242,13 @@ async def script_mode(filename: str):
     stop_event = asyncio.Event()
     ws_task = asyncio.create_task(websocket_listener(token, notification_queue, stop_event))
 
+    searches = {}
+
     async def process_notifications():
         while not stop_event.is_set():
             try:
                 notification = await notification_queue.get()
-                print(f"Уведомление: {json.dumps(notification, indent=2)}")
+                print_notification(searches, notification)
             except asyncio.CancelledError:
                 print("Обработка уведомлений завершена.")
                 break
@@ -167,7 +256,10 @@ async def script_mode(filename: str):
     notification_task = asyncio.create_task(process_notifications())
 
     for cmd in commands:
-        await send_search_request(token, cmd["word"], cmd["corpus_id"], cmd["algorithm"])
+        if "text" in cmd:
+            await send_batch_search_request(token, cmd["text"], cmd["corpus_id"], cmd["algorithm"])
+        else:
+            await send_search_request(token, cmd["word"], cmd["corpus_id"], cmd["algorithm"])
         await asyncio.sleep(1)
 
     await asyncio.sleep(2)
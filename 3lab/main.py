@@ -3,14 +3,20 @@ from fastapi import FastAPI
 from fastapi.openapi.utils import get_openapi
 from contextlib import asynccontextmanager
 from app.api.endpoints import router
-from app.db.db import engine
+from app.db.db import engine, async_engine
 from app.models.models import Base
-from app.websocket.websocket import websocket_endpoint
+from app.websocket.websocket import websocket_endpoint, hub, redis_client
+from app.auth.auth import token_cache
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     Base.metadata.create_all(bind=engine)  # Убедись, что эта строка выполняется
+    await hub.start()
+    await token_cache.start(redis_client)  # Подписка на отзыв токенов из других процессов
     yield
+    await token_cache.stop()
+    await hub.stop()
+    await async_engine.dispose()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -0,0 +1,34 @@
+# tests/test_bktree.py
+import pytest
+
+from app.services.bktree import BKTree, load_or_build_bktree
+from app.services.services import fuzzy_search
+from tests.test_search import random_vocabulary
+
+
+@pytest.mark.parametrize("algorithm", ["levenshtein", "damerau-levenshtein"])
+@pytest.mark.parametrize("max_distance", [0, 1, 2, 3])
+@pytest.mark.parametrize("top_k", [None, 3])
+def test_bktree_matches_scan(algorithm, max_distance, top_k):
+    # Для Дамерау-Левенштейна дерево ищет в радиусе 2k и проверяет кандидатов OSA
+    vocabulary = random_vocabulary(2)
+    tree = BKTree.build(vocabulary)
+    for word in ("abc", "dcba", "a", "abcdabcd"):
+        assert fuzzy_search(word, vocabulary, algorithm, max_distance=max_distance, top_k=top_k, bktree=tree) == (
+            fuzzy_search(word, vocabulary, algorithm, max_distance=max_distance, top_k=top_k)
+        ), word
+
+
+def test_bktree_file_round_trip(tmp_path):
+    vocabulary = random_vocabulary(3)
+    tree = load_or_build_bktree(str(tmp_path), "key", vocabulary)
+    loaded = BKTree.load(str(tmp_path / "bktree_key.json"), vocabulary)
+    assert loaded.indices == tree.indices and loaded.children == tree.children
+
+
+def test_broken_bktree_file_is_rebuilt(tmp_path):
+    vocabulary = random_vocabulary(4)
+    (tmp_path / "bktree_key.json").write_text('{"size": 1, "indi', encoding="utf-8")
+    tree = load_or_build_bktree(str(tmp_path), "key", vocabulary)
+    assert len(tree) == len(vocabulary)
+    assert BKTree.load(str(tmp_path / "bktree_key.json"), vocabulary) is not None
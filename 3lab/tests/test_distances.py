@@ -0,0 +1,110 @@
+# tests/test_distances.py
+import random
+
+import pytest
+
+from app.services.services import (
+    bitparallel_levenshtein_distance,
+    build_pattern_masks,
+    damerau_levenshtein_distance,
+    damerau_levenshtein_distance_bounded,
+    levenshtein_distance,
+    levenshtein_distance_bounded,
+)
+
+ALPHABET = "abcdё"
+
+
+def reference_osa_distance(s1: str, s2: str) -> int:
+    # Прежняя реализация damerau_levenshtein_distance на словаре с ключами (i, j)
+    if len(s1) < len(s2):
+        return reference_osa_distance(s2, s1)
+    if len(s2) == 0:
+        return len(s1)
+    d = {}
+    len1, len2 = len(s1), len(s2)
+    for i in range(-1, len1 + 1):
+        d[(i, -1)] = i + 1
+    for j in range(-1, len2 + 1):
+        d[(-1, j)] = j + 1
+    for i in range(len1):
+        for j in range(len2):
+            if s1[i] == s2[j]:
+                d[(i, j)] = d[(i-1, j-1)]
+            else:
+                d[(i, j)] = min(
+                    d[(i-1, j)] + 1,    # deletion
+                    d[(i, j-1)] + 1,    # insertion
+                    d[(i-1, j-1)] + 1   # substitution
+                )
+            if (i > 0 and j > 0 and s1[i] == s2[j-1] and s1[i-1] == s2[j]):
+                d[(i, j)] = min(d[(i, j)], d[(i-2, j-2)] + 1)  # transposition
+    return d[(len1-1, len2-1)]
+
+
+def random_pairs(count: int, max_length: int, seed: int):
+    # Маленький алфавит: много совпадений символов и транспозиций
+    rng = random.Random(seed)
+    for _ in range(count):
+        s1 = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, max_length)))
+        s2 = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, max_length)))
+        yield s1, s2
+
+
+@pytest.mark.parametrize("s1, s2, expected", [
+    ("", "", 0),
+    ("", "abc", 3),
+    ("kitten", "sitting", 3),
+    ("flaw", "lawn", 2),
+    ("строка", "строка", 0),
+])
+def test_levenshtein_known_values(s1, s2, expected):
+    assert levenshtein_distance(s1, s2) == expected
+    assert bitparallel_levenshtein_distance(build_pattern_masks(s1), len(s1), s2) == expected
+
+
+def test_bitparallel_matches_levenshtein():
+    for s1, s2 in random_pairs(5000, 12, seed=1):
+        masks = build_pattern_masks(s1)
+        assert bitparallel_levenshtein_distance(masks, len(s1), s2) == levenshtein_distance(s1, s2), (s1, s2)
+
+
+def test_bitparallel_long_pattern():
+    # Запрос длиннее машинного слова: битовые векторы - длинные целые Python
+    for s1, s2 in random_pairs(200, 150, seed=2):
+        masks = build_pattern_masks(s1)
+        assert bitparallel_levenshtein_distance(masks, len(s1), s2) == levenshtein_distance(s1, s2), (s1, s2)
+
+
+@pytest.mark.parametrize("s1, s2, expected", [
+    ("ab", "ba", 1),
+    ("ca", "abc", 3),  # OSA: подстрока после транспозиции не редактируется
+    ("abcdef", "badcfe", 3),
+])
+def test_damerau_known_values(s1, s2, expected):
+    assert damerau_levenshtein_distance(s1, s2) == expected
+    assert reference_osa_distance(s1, s2) == expected
+
+
+def test_damerau_matches_reference():
+    for s1, s2 in random_pairs(5000, 10, seed=3):
+        assert damerau_levenshtein_distance(s1, s2) == reference_osa_distance(s1, s2), (s1, s2)
+
+
+@pytest.mark.parametrize("max_distance", [0, 1, 2, 3, 5])
+def test_damerau_bounded_matches_reference(max_distance):
+    # Ограниченный вариант точен в пределах порога, а дальше возвращает max_distance + 1
+    for s1, s2 in random_pairs(2000, 10, seed=4 + max_distance):
+        expected = reference_osa_distance(s1, s2)
+        if expected > max_distance:
+            expected = max_distance + 1
+        assert damerau_levenshtein_distance_bounded(s1, s2, max_distance) == expected, (s1, s2)
+
+
+@pytest.mark.parametrize("max_distance", [0, 1, 2, 3, 5])
+def test_levenshtein_bounded_matches_full(max_distance):
+    for s1, s2 in random_pairs(2000, 10, seed=10 + max_distance):
+        expected = levenshtein_distance(s1, s2)
+        if expected > max_distance:
+            expected = max_distance + 1
+        assert levenshtein_distance_bounded(s1, s2, max_distance) == expected, (s1, s2)
@@ -0,0 +1,117 @@
+# tests/test_search.py
+import random
+
+import pytest
+
+from app.services.services import (
+    damerau_levenshtein_distance,
+    fuzzy_search,
+    fuzzy_search_batch,
+    levenshtein_distance,
+)
+from app.services.symspell import SymSpellIndex, generate_deletes
+from app.services.vocabulary import Vocabulary
+
+CORPUS = "кот кит кто код коты который скот ток кот мост лист лес кость котик"
+DISTANCES = {"levenshtein": levenshtein_distance, "damerau-levenshtein": damerau_levenshtein_distance}
+
+
+def random_vocabulary(seed: int, words: int = 400) -> Vocabulary:
+    rng = random.Random(seed)
+    return Vocabulary.from_text(" ".join(
+        "".join(rng.choice("abcd") for _ in range(rng.randint(1, 8))) for _ in range(words)
+    ))
+
+
+def brute_force(word, vocabulary, algorithm, max_distance=None, top_k=None):
+    # Эталон: все токены, устойчивая сортировка по расстоянию, затем порог и топ
+    distance = DISTANCES[algorithm]
+    rows = [(token, distance(word, token), count) for token, count in vocabulary.items()]
+    rows.sort(key=lambda row: row[1])
+    if max_distance is not None:
+        rows = [row for row in rows if row[1] <= max_distance]
+    return rows if top_k is None else rows[:top_k]
+
+
+@pytest.mark.parametrize("algorithm", ["levenshtein", "damerau-levenshtein"])
+@pytest.mark.parametrize("engine", ["python", "bitparallel"])
+@pytest.mark.parametrize("max_distance", [None, 0, 1, 2])
+@pytest.mark.parametrize("top_k", [None, 1, 5])
+def test_bounded_search_matches_brute_force(algorithm, engine, max_distance, top_k):
+    # Равные расстояния идут в порядке словаря, как при устойчивой сортировке
+    vocabulary = random_vocabulary(1)
+    for word in ("abc", "d", "abcdabcd", "cab"):
+        assert fuzzy_search(word, vocabulary, algorithm, engine, max_distance, top_k) == (
+            brute_force(word, vocabulary, algorithm, max_distance, top_k)
+        ), word
+
+
+def test_top_k_tightens_bound():
+    # Когда топ заполнен, порог сужается до худшего в нём, и дальние по длине корзины не считаются
+    vocabulary = Vocabulary.from_text("ab ac ad " + " ".join("x" * n for n in range(10, 40)))
+    stats = {}
+    results = fuzzy_search("ab", vocabulary, "levenshtein", top_k=2, stats=stats)
+    assert [token for token, _, _ in results] == ["ab", "ac"]
+    assert stats["visited"] < len(vocabulary)
+
+
+@pytest.mark.parametrize("algorithm", ["levenshtein", "damerau-levenshtein"])
+@pytest.mark.parametrize("max_distance, top_k", [(None, None), (None, 3), (1, None), (2, 5)])
+def test_batch_matches_per_word(algorithm, max_distance, top_k):
+    # Повторы и пустой список слов тоже должны совпадать с поиском по одному слову
+    vocabulary = random_vocabulary(12)
+    words = ["abc", "d", "abc", "abcdabcd", "ёж"]
+    expected = [fuzzy_search(word, vocabulary, algorithm, "bitparallel", max_distance, top_k) for word in words]
+    assert fuzzy_search_batch(words, vocabulary, algorithm, "bitparallel", max_distance, top_k) == expected
+    assert fuzzy_search_batch([], vocabulary, algorithm, "bitparallel", max_distance, top_k) == []
+
+
+def test_symspell_without_bound_does_not_depend_on_index():
+    # Без max_distance результат один и тот же, построен индекс или ещё нет
+    vocabulary = Vocabulary.from_text(CORPUS)
+    index = SymSpellIndex.build(vocabulary, 1)
+    expected = fuzzy_search("котт", vocabulary, "levenshtein", top_k=20)
+    assert fuzzy_search("котт", vocabulary, "symspell", top_k=20) == expected
+    assert fuzzy_search("котт", vocabulary, "symspell", top_k=20, symspell=index) == expected
+    assert fuzzy_search_batch(["котт"], vocabulary, "symspell", top_k=20, symspell=index) == [expected]
+
+
+def test_symspell_with_bound_matches_scan():
+    vocabulary = Vocabulary.from_text(CORPUS)
+    index = SymSpellIndex.build(vocabulary, 2)
+    for max_distance in (0, 1, 2):
+        expected = fuzzy_search("кот", vocabulary, "levenshtein", max_distance=max_distance, top_k=5)
+        assert fuzzy_search(
+            "кот", vocabulary, "symspell", max_distance=max_distance, top_k=5, symspell=index,
+        ) == expected
+
+
+@pytest.mark.parametrize("prefix_length", [1, 3, 7, None])
+def test_symspell_prefix_matches_scan(prefix_length):
+    # Удаления от префикса дают больше кандидатов, но после проверки расстояния ответ тот же
+    vocabulary = random_vocabulary(5)
+    index = SymSpellIndex.build(vocabulary, 2, prefix_length=prefix_length)
+    for word in ("abc", "dcba", "a", "abcdabcd", "abcdabcdabcd"):
+        for max_distance in (0, 1, 2):
+            assert fuzzy_search(word, vocabulary, "symspell", max_distance=max_distance, symspell=index) == (
+                fuzzy_search(word, vocabulary, "levenshtein", max_distance=max_distance)
+            ), (word, max_distance)
+
+
+def test_symspell_long_token_deletes_are_bounded():
+    # Токен в 2000 символов даёт столько же вариантов, сколько слово длины PREFIX_LENGTH
+    vocabulary = Vocabulary.from_text("".join(chr(0x400 + i) for i in range(2000)))
+    index = SymSpellIndex.build(vocabulary, 2, max_memory_bytes=1024 * 1024)
+    assert len(index.deletes) == len(generate_deletes("abcdefg", 2))
+    matches, _ = index.search(vocabulary.tokens[0][:-1], 2)
+    assert matches == [(1, 0)]
+
+
+def test_symspell_file_round_trip(tmp_path):
+    vocabulary = Vocabulary.from_text(CORPUS)
+    path = str(tmp_path / "symspell_key.json")
+    SymSpellIndex.build(vocabulary, 1).save(path)
+    loaded = SymSpellIndex.load(path, vocabulary)
+    assert loaded.search("кот", 1)[0] and loaded.max_distance == 1
+    (tmp_path / "symspell_key.json").write_text('{"size": 14, "del', encoding="utf-8")
+    assert SymSpellIndex.load(path, vocabulary) is None
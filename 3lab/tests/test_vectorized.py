@@ -0,0 +1,35 @@
+# tests/test_vectorized.py
+import pytest
+
+from app.services.services import fuzzy_search
+from tests.test_search import random_vocabulary
+
+WORDS = ("abc", "d", "abcdabcd", "cab", "", "ёжик")
+
+
+@pytest.mark.parametrize("max_distance", [None, 0, 1, 2])
+@pytest.mark.parametrize("top_k", [None, 1, 5])
+def test_numpy_engine_matches_python(max_distance, top_k):
+    pytest.importorskip("numpy")
+    vocabulary = random_vocabulary(6)
+    for word in WORDS:
+        assert fuzzy_search(word, vocabulary, "levenshtein", "numpy", max_distance, top_k) == (
+            fuzzy_search(word, vocabulary, "levenshtein", "python", max_distance, top_k)
+        ), word
+
+
+def test_numpy_engine_reports_progress():
+    pytest.importorskip("numpy")
+    vocabulary = random_vocabulary(7)
+    calls = []
+    fuzzy_search("abc", vocabulary, "levenshtein", "numpy", progress=lambda done, total: calls.append((done, total)))
+    assert calls[-1] == (len(vocabulary), len(vocabulary))
+    assert all(earlier[0] <= later[0] for earlier, later in zip(calls, calls[1:]))
+
+
+def test_numpy_engine_falls_back_for_damerau():
+    # Ядро считает только Левенштейна; остальные алгоритмы идут путём на чистом Python
+    vocabulary = random_vocabulary(8)
+    assert fuzzy_search("abdc", vocabulary, "damerau-levenshtein", "numpy", 1, 5) == (
+        fuzzy_search("abdc", vocabulary, "damerau-levenshtein", "python", 1, 5)
+    )
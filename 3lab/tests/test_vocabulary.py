@@ -0,0 +1,38 @@
+# tests/test_vocabulary.py
+import random
+
+import pytest
+
+from app.services.vocabulary import TokenTooLongError, Vocabulary, VocabularyBuilder
+
+
+def feed_in_chunks(text: str, rng: random.Random, builder: VocabularyBuilder) -> Vocabulary:
+    data = text.encode("utf-8")
+    position = 0
+    while position < len(data):
+        size = rng.randint(1, 7)
+        builder.feed_bytes(data[position:position + size])
+        position += size
+    return builder.finish()
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_builder_matches_from_text(seed):
+    # Куски режут токены, пробелы и многобайтовые символы в случайных местах
+    rng = random.Random(seed)
+    text = "".join(rng.choice("ab ё\n\tкот") for _ in range(rng.randint(0, 300)))
+    expected = Vocabulary.from_text(text)
+    vocabulary = feed_in_chunks(text, rng, VocabularyBuilder())
+    assert vocabulary.tokens == expected.tokens
+    assert vocabulary.frequencies == expected.frequencies
+
+
+def test_builder_long_token_without_whitespace():
+    vocabulary = feed_in_chunks("x" * 5000 + " y", random.Random(0), VocabularyBuilder())
+    assert vocabulary.tokens == ["x" * 5000, "y"]
+
+
+def test_builder_rejects_token_over_limit():
+    builder = VocabularyBuilder(max_token_length=100)
+    with pytest.raises(TokenTooLongError):
+        feed_in_chunks("x" * 1000, random.Random(0), builder)
@@ -0,0 +1,56 @@
+# tests/test_vocabulary_file.py
+import pytest
+
+from app.services.services import fuzzy_search
+from app.services.vocabulary import Vocabulary
+from app.services.vocabulary_file import MappedVocabulary, vocabulary_file_path, write_vocabulary_file
+from tests.test_search import random_vocabulary
+
+
+def open_copy(tmp_path, vocabulary: Vocabulary) -> MappedVocabulary:
+    path = vocabulary_file_path(str(tmp_path), "key")
+    write_vocabulary_file(path, vocabulary)
+    mapped = MappedVocabulary.open(path)
+    assert mapped is not None
+    return mapped
+
+
+def test_round_trip(tmp_path):
+    # Многобайтовые символы и токены разной длины, включая символы вне BMP
+    vocabulary = Vocabulary.from_text("кот кот кит ёж a 𝔘𝔫𝔦 abcdefgh кот ёж")
+    mapped = open_copy(tmp_path, vocabulary)
+    assert len(mapped) == len(vocabulary)
+    assert list(mapped.tokens) == vocabulary.tokens
+    assert list(mapped.frequencies) == vocabulary.frequencies
+    assert {length: list(indices) for length, indices in mapped.buckets.items()} == vocabulary.buckets
+
+
+@pytest.mark.parametrize("shard_count", [1, 3])
+def test_shards_match(tmp_path, shard_count):
+    vocabulary = random_vocabulary(9)
+    mapped = open_copy(tmp_path, vocabulary)
+    for shard_index in range(shard_count):
+        expected = vocabulary.shard(shard_index, shard_count)
+        shard = mapped.shard(shard_index, shard_count)
+        assert shard.tokens == expected.tokens
+        assert list(shard.frequencies) == expected.frequencies
+
+
+@pytest.mark.parametrize("engine", ["python", "bitparallel", "numpy"])
+@pytest.mark.parametrize("max_distance, top_k", [(None, None), (1, None), (None, 5), (2, 3)])
+def test_search_matches_in_memory(tmp_path, engine, max_distance, top_k):
+    vocabulary = random_vocabulary(10)
+    mapped = open_copy(tmp_path, vocabulary)
+    for word in ("abc", "dcba", "a"):
+        assert fuzzy_search(word, mapped, "levenshtein", engine, max_distance, top_k) == (
+            fuzzy_search(word, vocabulary, "levenshtein", engine, max_distance, top_k)
+        ), word
+
+
+def test_broken_file_is_ignored(tmp_path):
+    path = vocabulary_file_path(str(tmp_path), "key")
+    write_vocabulary_file(path, random_vocabulary(11))
+    with open(path, "r+b") as f:
+        f.truncate(40)
+    assert MappedVocabulary.open(path) is None
+    assert MappedVocabulary.open(str(tmp_path / "missing.bin")) is None